@@ -7,6 +7,9 @@ import interfaces.AggregatorV3Interface as AggregatorV3Interface
 interface CubeToken:
     def mint(_to: address, _amount: uint256) -> bool: nonpayable
 
+interface ERC20Permit:
+    def permit(_owner: address, _spender: address, _amount: uint256, _deadline: uint256, _v: uint8, _r: bytes32, _s: bytes32): nonpayable
+
 # @title CubeFarm
 # @license MIT
 # @author jrmunchkin
@@ -17,18 +20,69 @@ interface CubeToken:
 #    For example if the rate is 86400 seconds (1 day) and the amount staked is 1 ether, then the reward will be 1 ether (in CubeToken) after 1 day of staking.
 #    Ownership of the CubeToken contract should be transferred to the CubeFarm contract after deployment.
 #    This contract also implements the Chainlink price feed.
+#    The configuration is kept in storage instead of immutables so the contract can also be deployed
+#    as a minimal proxy by CubeFarmFactory, which then calls initialize.
+#    Rewards are tracked per token with an accumulator (s_accRewardPerShare) holding the sum of the emission
+#    multiplied by the token price, updated lazily on each user action.
+#    The emission is the elapsed time multiplied by EMISSION_PRECISION and weighted by rate / rate applied,
+#    the owner can schedule rate changes with scheduleRate. The checkpoints (s_rateCheckpoints) pack their timestamp
+#    in the upper 64 bits and the emission reached at this timestamp in the lower 192 bits, so the emission of any time
+#    only needs a binary search over the checkpoints. Without rate change the emission is the elapsed time itself.
+#    The rewards of a position are balance * (accRewardPerShare - userRewardPerSharePaid) / (rate * PRICE_PRECISION * EMISSION_PRECISION),
+#    the prices being converted from the decimals of their price feed to PRICE_PRECISION when they are cached,
+#    so changing the price feed of a token for one with other decimals does not change the rewards already accrued.
+#    The balance and the start time of a position are packed in a single storage slot (s_positions),
+#    the balance in the lower 192 bits and the start time in the upper 64 bits.
+#    The price of each token is cached (s_tokenPrices) and read from the price feed at most once per epoch of PRICE_EPOCH seconds,
+#    by the first action on the token in a new epoch or by pokePrices. The price of a removed token is no longer read,
+#    and setPriceFeedContract and removeAllowedToken accrue at the cached price, so a failing price feed can be replaced or removed.
+#    The time elapsed since the last update of a pool accrues at the cached price, so the rewards follow the price checkpoints
+#    instead of the price at claim time.
+#    The price and its epoch are packed like the positions, the price in the lower 192 bits and the epoch in the upper 64 bits.
+
+POSITION_TIME_SHIFT: constant(uint256) = 2**192
+MAX_POSITION_BALANCE: constant(uint256) = 2**192 - 1
+MAX_STAKERS_PAGE_SIZE: constant(uint256) = 1024
+PRICE_EPOCH: constant(uint256) = 3600
+PRICE_EPOCH_SHIFT: constant(uint256) = 2**192
+EMISSION_PRECISION: constant(uint256) = 10**9
+PRICE_PRECISION: constant(uint256) = 10**18
+RATE_CHECKPOINT_TIME_SHIFT: constant(uint256) = 2**192
+MAX_RATE_SEARCH_STEPS: constant(uint256) = 64
 
-i_cubeToken: immutable(CubeToken)
-i_rate: immutable(uint256)
-i_owner: immutable(address)
+s_cubeToken: CubeToken
+s_rate: uint256
+s_owner: address
 s_allowedTokens: DynArray[address, 128]
-s_stakers: DynArray[address, 1024]
+s_allowedTokensIndex: HashMap[address, uint256]
+s_stakers: HashMap[uint256, address]
 s_stakersIndex: HashMap[address, uint256]
-s_uniqueTokensStaked: HashMap[address, uint256]
+s_stakerCount: uint256
+s_userTokens: HashMap[address, DynArray[address, 128]]
+s_userTokensIndex: HashMap[address, HashMap[address, uint256]]
 s_tokenPriceFeeds: HashMap[address, address]
+s_tokenPriceScale: HashMap[address, uint256]
+s_tokenPrices: HashMap[address, uint256]
 s_cubeBalance: HashMap[address, uint256]
-s_stakingBalance: HashMap[address, HashMap[address, uint256]]
-s_startTime: HashMap[address, HashMap[address, uint256]]
+s_positions: HashMap[address, HashMap[address, uint256]]
+s_userRewardPerSharePaid: HashMap[address, HashMap[address, uint256]]
+s_accRewardPerShare: HashMap[address, uint256]
+s_lastRewardTime: HashMap[address, uint256]
+s_totalStaked: HashMap[address, uint256]
+s_totalRewardsAccrued: uint256
+s_rateCheckpoints: HashMap[uint256, uint256]
+s_rateCheckpointRates: HashMap[uint256, uint256]
+s_rateCheckpointCount: uint256
+
+struct TokenAmount:
+    token: address
+    amount: uint256
+
+struct Position:
+    token: address
+    balance: uint256
+    startTime: uint256
+    pendingRewards: uint256
 
 event TokenStaked:
     token: indexed(address)
@@ -44,6 +98,10 @@ event YieldRewarded:
     staker: indexed(address)
     rewards: uint256
 
+event RateScheduled:
+    timestamp: uint256
+    rate: uint256
+
 @external
 def __init__(_cubeTokenAddress: address, _rate: uint256):
     """
@@ -51,9 +109,24 @@ def __init__(_cubeTokenAddress: address, _rate: uint256):
     @param _cubeTokenAddress CubeToken contract address
     @param _rate rate in seconds for calculating the rewards
     """
-    i_cubeToken = CubeToken(_cubeTokenAddress)
-    i_rate = _rate
-    i_owner = msg.sender
+    self.s_cubeToken = CubeToken(_cubeTokenAddress)
+    self.s_rate = _rate
+    self.s_owner = msg.sender
+
+@external
+def initialize(_cubeTokenAddress: address, _rate: uint256, _owner: address):
+    """
+    @notice Initialize a farm deployed as a minimal proxy by CubeFarmFactory
+    @param _cubeTokenAddress CubeToken contract address
+    @param _rate rate in seconds for calculating the rewards
+    @param _owner owner of the farm
+    @dev Can only be called once, a farm deployed with the constructor is already initialized
+    """
+    assert self.s_owner == empty(address), "Already initialized"
+    assert _owner != empty(address), "Invalid owner"
+    self.s_cubeToken = CubeToken(_cubeTokenAddress)
+    self.s_rate = _rate
+    self.s_owner = _owner
 
 @external
 def setPriceFeedContract(_token: address, _priceFeedAddress: address):
@@ -61,9 +134,57 @@ def setPriceFeedContract(_token: address, _priceFeedAddress: address):
     @notice Set the price feed for a specific token
     @param _token token address
     @param _priceFeedAddress price feed address
+    @dev The decimals of the price feed are read once and stored as a scale factor used to convert its prices to PRICE_PRECISION.
+        The rewards accrued until now use the cached price without reading the previous price feed,
+        so a failing feed can be replaced. The new price feed is read right away.
     """
-    assert msg.sender == i_owner, "Only owner can set price feed"
+    assert msg.sender == self.s_owner, "Only owner can set price feed"
+    self.accruePool(_token)
     self.s_tokenPriceFeeds[_token] = _priceFeedAddress
+    decimals: uint8 = 0
+    if _priceFeedAddress != empty(address):
+        decimals = AggregatorV3Interface(_priceFeedAddress).decimals()
+    self.s_tokenPriceScale[_token] = 10**convert(decimals, uint256)
+    self.s_tokenPrices[_token] = 0
+    self.updatePrice(_token)
+
+@external
+def scheduleRate(_timestamp: uint256, _rate: uint256):
+    """
+    @notice Change the rate from a given timestamp
+    @param _timestamp timestamp from which the rate applies, now or in the future
+    @param _rate rate in seconds for calculating the rewards from this timestamp
+    @dev The schedule is append only, the timestamps must be increasing.
+        The emission reached at the timestamp is stored with it so the emission of any time is one checkpoint lookup away.
+        log an event RateScheduled when the rate is scheduled
+    """
+    assert msg.sender == self.s_owner, "Only owner can schedule rate"
+    assert _rate != 0, "Invalid rate"
+    assert _timestamp >= block.timestamp, "Cannot schedule rate in the past"
+    count: uint256 = self.s_rateCheckpointCount
+    if count != 0:
+        assert _timestamp > self.s_rateCheckpoints[count - 1] / RATE_CHECKPOINT_TIME_SHIFT, "Timestamp before last checkpoint"
+    assert _timestamp < 2**64, "Timestamp too high"
+    emission: uint256 = self.getEmissionAt(_timestamp)
+    assert emission < RATE_CHECKPOINT_TIME_SHIFT, "Emission too high"
+    self.s_rateCheckpoints[count] = _timestamp * RATE_CHECKPOINT_TIME_SHIFT + emission
+    self.s_rateCheckpointRates[count] = _rate
+    self.s_rateCheckpointCount = count + 1
+    log RateScheduled(_timestamp, _rate)
+
+@external
+def pokePrices():
+    """
+    @notice Accrue the rewards of all the allowed tokens and refresh their price if a new epoch started
+    @dev Anyone can call it, calling it at the start of each epoch keeps the price checkpoints one epoch apart.
+        A token whose price feed fails keeps its cached price instead of reverting the refresh of the others.
+    """
+    allowedTokens: DynArray[address, 128] = self.s_allowedTokens
+    for token in allowedTokens:
+        if self.canUpdatePrice(token):
+            self.updatePool(token)
+        else:
+            self.accruePool(token)
 
 @external
 def addAllowedToken(_token: address):
@@ -71,8 +192,31 @@ def addAllowedToken(_token: address):
     @notice Add a token to the allowed tokens list
     @param _token token address to add to the list
     """
-    assert msg.sender == i_owner, "Only owner can add token"
+    assert msg.sender == self.s_owner, "Only owner can add token"
+    assert not self.isTokenAllowed(_token), "Token already allowed"
     self.s_allowedTokens.append(_token)
+    self.s_allowedTokensIndex[_token] = len(self.s_allowedTokens)
+    self.s_lastRewardTime[_token] = block.timestamp
+
+@external
+def removeAllowedToken(_token: address):
+    """
+    @notice Remove a token from the allowed tokens list
+    @param _token token address to remove from the list
+    @dev The last token of the list takes the place of the removed one.
+        Users can still claim and unstake a removed token they already staked.
+        A removed token stops accruing rewards and its price feed is no longer read,
+        so removing a token with a failing price feed lets its stakers unstake.
+    """
+    assert msg.sender == self.s_owner, "Only owner can remove token"
+    assert self.isTokenAllowed(_token), "Token not allowed"
+    self.accruePool(_token)
+    index: uint256 = self.s_allowedTokensIndex[_token] - 1
+    lastToken: address = self.s_allowedTokens[len(self.s_allowedTokens) - 1]
+    self.s_allowedTokens[index] = lastToken
+    self.s_allowedTokensIndex[lastToken] = index + 1
+    self.s_allowedTokens.pop()
+    self.s_allowedTokensIndex[_token] = 0
 
 @external
 @nonreentrant("lock")
@@ -83,22 +227,40 @@ def stakeTokens(_amount: uint256, _token: address):
     @param _token address of the token to stake
     @dev log an event TokenStaked when token is staked
     """
-    assert _amount > 0, "Cannot stake amount 0"
-    assert ERC20(_token).balanceOf(msg.sender) >= _amount, "Not enough balance"
-    assert self.isTokenAllowed(_token), "Cannot stake not allowed token"
-    if self.s_stakingBalance[_token][msg.sender] <= 0:
-        self.s_uniqueTokensStaked[msg.sender] += 1
-    if self.s_stakingBalance[_token][msg.sender] > 0:
-        toTransfer: uint256 = self.getUserYieldRewardsByToken(msg.sender, _token)
-        self.s_cubeBalance[msg.sender] += toTransfer
-    self.s_stakingBalance[_token][msg.sender] += _amount
-    if self.s_uniqueTokensStaked[msg.sender] == 1:
-        self.s_stakers.append(msg.sender)
-        self.s_stakersIndex[msg.sender] = len(self.s_stakers) - 1
-    self.s_startTime[_token][msg.sender] = block.timestamp
-    success: bool = ERC20(_token).transferFrom(msg.sender, self, _amount)
-    assert success, "External call failed"
-    log TokenStaked(_token, msg.sender, _amount)
+    wasStaker: bool = len(self.s_userTokens[msg.sender]) != 0
+    self.stake(msg.sender, _token, _amount)
+    self.updateStaker(msg.sender, wasStaker)
+
+@external
+@nonreentrant("lock")
+def stakeWithPermit(_amount: uint256, _token: address, _deadline: uint256, _v: uint8, _r: bytes32, _s: bytes32):
+    """
+    @notice Allow user to stake tokens approved with an EIP-2612 permit signature
+    @param _amount amount to stake
+    @param _token address of the token to stake, must implement EIP-2612 permit
+    @param _deadline timestamp until which the signature is valid
+    @param _v v of the permit signature
+    @param _r r of the permit signature
+    @param _s s of the permit signature
+    @dev log an event TokenStaked when token is staked
+    """
+    ERC20Permit(_token).permit(msg.sender, self, _amount, _deadline, _v, _r, _s)
+    wasStaker: bool = len(self.s_userTokens[msg.sender]) != 0
+    self.stake(msg.sender, _token, _amount)
+    self.updateStaker(msg.sender, wasStaker)
+
+@external
+@nonreentrant("lock")
+def stakeMany(_stakes: DynArray[TokenAmount, 128]):
+    """
+    @notice Allow user to stake several tokens at once
+    @param _stakes list of tokens and amounts to stake
+    @dev log an event TokenStaked for each token staked
+    """
+    wasStaker: bool = len(self.s_userTokens[msg.sender]) != 0
+    for tokenAmount in _stakes:
+        self.stake(msg.sender, tokenAmount.token, tokenAmount.amount)
+    self.updateStaker(msg.sender, wasStaker)
 
 @external
 @nonreentrant("lock")
@@ -109,21 +271,36 @@ def unstakeTokens(_amount: uint256, _token: address):
     @param _token address of the token to unstake
     @dev log an event TokenUnstaked when token is unstaked
     """
-    userBalance: uint256 = self.s_stakingBalance[_token][msg.sender]
-    assert userBalance > 0, "Cannot unstake 0 blance"
-    assert userBalance >= _amount, "Cannot unstake more than user balance"
-    toTransfer: uint256 = self.getUserYieldRewardsByToken(msg.sender, _token)
-    self.s_startTime[_token][msg.sender] = block.timestamp
-    self.s_stakingBalance[_token][msg.sender] -= _amount
-    self.s_cubeBalance[msg.sender] += toTransfer
-    if self.s_stakingBalance[_token][msg.sender] == 0:
-        self.s_uniqueTokensStaked[msg.sender] -= 1
-    if self.s_uniqueTokensStaked[msg.sender] == 0:
-        self.s_stakers[self.s_stakersIndex[msg.sender]] = self.s_stakers[len(self.s_stakers) - 1]
-        self.s_stakers.pop()
-    success: bool = ERC20(_token).transfer(msg.sender, _amount)
-    assert success, "External call failed"
-    log TokenUnstaked(_token, msg.sender, _amount)
+    self.unstake(msg.sender, _token, _amount)
+    self.updateStaker(msg.sender, True)
+
+@external
+@nonreentrant("lock")
+def unstakeMany(_unstakes: DynArray[TokenAmount, 128]):
+    """
+    @notice Allow user to unstake several tokens at once
+    @param _unstakes list of tokens and amounts to unstake
+    @dev log an event TokenUnstaked for each token unstaked
+    """
+    wasStaker: bool = len(self.s_userTokens[msg.sender]) != 0
+    for tokenAmount in _unstakes:
+        self.unstake(msg.sender, tokenAmount.token, tokenAmount.amount)
+    self.updateStaker(msg.sender, wasStaker)
+
+@external
+@nonreentrant("lock")
+def exitAll():
+    """
+    @notice Allow user to unstake all his tokens and claim his rewards
+    @dev log an event TokenUnstaked for each token unstaked and an event YieldRewarded if there are rewards
+    """
+    userTokens: DynArray[address, 128] = self.s_userTokens[msg.sender]
+    assert len(userTokens) > 0, "No tokens to unstake"
+    for token in userTokens:
+        self.unstake(msg.sender, token, self.getPositionBalance(self.s_positions[token][msg.sender]))
+    self.updateStaker(msg.sender, True)
+    if self.s_cubeBalance[msg.sender] != 0:
+        self.claimRewards(msg.sender, empty(DynArray[address, 128]))
 
 @external
 @nonreentrant("lock")
@@ -132,27 +309,191 @@ def claimYieldRewards():
     @notice Allow user to claim his rewards
     @dev log an event YieldRewarded when rewards have been claimed
     """
-    toTransfer: uint256 = self.getUserTotalYieldRewards(msg.sender)
-    if self.s_cubeBalance[msg.sender] != 0:
-        oldBalance: uint256 = self.s_cubeBalance[msg.sender]
-        self.s_cubeBalance[msg.sender] = 0
-        toTransfer += oldBalance
-    for allowedToken in self.s_allowedTokens:
-        self.s_startTime[allowedToken][msg.sender] = block.timestamp
+    self.claimRewards(msg.sender, self.s_userTokens[msg.sender])
+
+@external
+@nonreentrant("lock")
+def claimYieldRewardsFor(_tokens: DynArray[address, 128]):
+    """
+    @notice Allow user to claim his rewards only for specific tokens
+    @param _tokens addresses of the tokens to claim the rewards for
+    @dev log an event YieldRewarded when rewards have been claimed
+        The Cube balance already credited to the user is always claimed.
+    """
+    self.claimRewards(msg.sender, _tokens)
+
+@external
+@nonreentrant("lock")
+def compound():
+    """
+    @notice Allow user to stake his rewards as Cube tokens without claiming them first
+    @dev log an event YieldRewarded and an event TokenStaked when rewards have been compounded.
+        The rewards are minted directly to the CubeFarm contract.
+    """
+    assert self.isTokenAllowed(self.s_cubeToken.address), "Cannot stake not allowed token"
+    wasStaker: bool = len(self.s_userTokens[msg.sender]) != 0
+    toCompound: uint256 = self.collectRewards(msg.sender, self.s_userTokens[msg.sender])
+    assert toCompound > 0, "No rewards to transfer"
+    self.s_cubeToken.mint(self, toCompound)
+    log YieldRewarded(msg.sender, toCompound)
+    self.addToPosition(msg.sender, self.s_cubeToken.address, toCompound)
+    self.updateStaker(msg.sender, wasStaker)
+    log TokenStaked(self.s_cubeToken.address, msg.sender, toCompound)
+
+@internal
+def stake(_user: address, _token: address, _amount: uint256):
+    """
+    @notice Stake tokens for a user
+    @param _user address of the user
+    @param _token address of the token to stake
+    @param _amount amount to stake
+    @dev log an event TokenStaked when token is staked.
+        The stakers list is not updated, see updateStaker.
+    """
+    assert _amount > 0, "Cannot stake amount 0"
+    assert ERC20(_token).balanceOf(_user) >= _amount, "Not enough balance"
+    assert self.isTokenAllowed(_token), "Cannot stake not allowed token"
+    self.addToPosition(_user, _token, _amount)
+    success: bool = ERC20(_token).transferFrom(_user, self, _amount)
+    assert success, "External call failed"
+    log TokenStaked(_token, _user, _amount)
+
+@internal
+def addToPosition(_user: address, _token: address, _amount: uint256):
+    """
+    @notice Add an amount to the position of a user, the tokens must already be owned by the contract
+    @param _user address of the user
+    @param _token address of the token
+    @param _amount amount to add
+    """
+    userBalance: uint256 = self.getPositionBalance(self.s_positions[_token][_user])
+    assert userBalance + _amount <= MAX_POSITION_BALANCE, "Cannot stake more than max balance"
+    if userBalance == 0:
+        self.addUserToken(_user, _token)
+    toTransfer: uint256 = self.settleRewards(_user, _token, userBalance)
+    if toTransfer != 0:
+        self.s_cubeBalance[_user] += toTransfer
+    self.s_positions[_token][_user] = self.packPosition(userBalance + _amount, block.timestamp)
+    self.s_totalStaked[_token] += _amount
+
+@internal
+def unstake(_user: address, _token: address, _amount: uint256):
+    """
+    @notice Unstake tokens for a user
+    @param _user address of the user
+    @param _token address of the token to unstake
+    @param _amount amount to unstake
+    @dev log an event TokenUnstaked when token is unstaked.
+        The stakers list is not updated, see updateStaker.
+    """
+    userBalance: uint256 = self.getPositionBalance(self.s_positions[_token][_user])
+    assert userBalance > 0, "Cannot unstake 0 blance"
+    assert userBalance >= _amount, "Cannot unstake more than user balance"
+    toTransfer: uint256 = self.settleRewards(_user, _token, userBalance)
+    self.s_positions[_token][_user] = self.packPosition(userBalance - _amount, block.timestamp)
+    self.s_totalStaked[_token] -= _amount
+    if toTransfer != 0:
+        self.s_cubeBalance[_user] += toTransfer
+    if userBalance == _amount:
+        self.removeUserToken(_user, _token)
+    success: bool = ERC20(_token).transfer(_user, _amount)
+    assert success, "External call failed"
+    log TokenUnstaked(_token, _user, _amount)
+
+@internal
+def claimRewards(_user: address, _tokens: DynArray[address, 128]):
+    """
+    @notice Mint the rewards of the user for a list of tokens
+    @param _user address of the user
+    @param _tokens addresses of the tokens to claim the rewards for
+    @dev Tokens not staked by the user are skipped
+    """
+    toTransfer: uint256 = self.collectRewards(_user, _tokens)
     assert toTransfer > 0, "No rewards to transfer"
-    i_cubeToken.mint(msg.sender, toTransfer)
-    log YieldRewarded(msg.sender, toTransfer)
+    self.s_cubeToken.mint(_user, toTransfer)
+    log YieldRewarded(_user, toTransfer)
 
 @internal
+def collectRewards(_user: address, _tokens: DynArray[address, 128]) -> uint256:
+    """
+    @notice Settle the rewards of the user for a list of tokens and empty his Cube balance
+    @param _user address of the user
+    @param _tokens addresses of the tokens to settle the rewards for
+    @return rewards rewards settled plus the previous Cube balance
+    @dev Tokens not staked by the user are skipped
+    """
+    rewards: uint256 = 0
+    for token in _tokens:
+        balance: uint256 = self.getPositionBalance(self.s_positions[token][_user])
+        if balance > 0:
+            rewards += self.settleRewards(_user, token, balance)
+            self.s_positions[token][_user] = self.packPosition(balance, block.timestamp)
+    if self.s_cubeBalance[_user] != 0:
+        oldBalance: uint256 = self.s_cubeBalance[_user]
+        self.s_cubeBalance[_user] = 0
+        rewards += oldBalance
+    return rewards
+
+@internal
+def addUserToken(_user: address, _token: address):
+    """
+    @notice Add a token to the list of tokens staked by the user
+    @param _user address of the user
+    @param _token address of the token
+    """
+    self.s_userTokens[_user].append(_token)
+    self.s_userTokensIndex[_user][_token] = len(self.s_userTokens[_user])
+
+@internal
+def removeUserToken(_user: address, _token: address):
+    """
+    @notice Remove a token from the list of tokens staked by the user
+    @param _user address of the user
+    @param _token address of the token
+    @dev s_userTokensIndex stores the index + 1 of the token
+    """
+    index: uint256 = self.s_userTokensIndex[_user][_token] - 1
+    lastToken: address = self.s_userTokens[_user][len(self.s_userTokens[_user]) - 1]
+    self.s_userTokens[_user][index] = lastToken
+    self.s_userTokensIndex[_user][lastToken] = index + 1
+    self.s_userTokens[_user].pop()
+    self.s_userTokensIndex[_user][_token] = 0
+
+@internal
+def updateStaker(_user: address, _wasStaker: bool):
+    """
+    @notice Add or remove the user from the stakers once his positions have been updated
+    @param _user address of the user
+    @param _wasStaker true if the user was staking tokens before the update
+    @dev s_stakersIndex stores the index + 1 of the staker.
+        The last staker takes the place of the removed one.
+    """
+    isStaker: bool = len(self.s_userTokens[_user]) != 0
+    if isStaker and not _wasStaker:
+        stakerCount: uint256 = self.s_stakerCount
+        self.s_stakers[stakerCount] = _user
+        self.s_stakersIndex[_user] = stakerCount + 1
+        self.s_stakerCount = stakerCount + 1
+    elif _wasStaker and not isStaker:
+        lastIndex: uint256 = self.s_stakerCount - 1
+        index: uint256 = self.s_stakersIndex[_user] - 1
+        lastStaker: address = self.s_stakers[lastIndex]
+        self.s_stakers[index] = lastStaker
+        self.s_stakersIndex[lastStaker] = index + 1
+        self.s_stakers[lastIndex] = empty(address)
+        self.s_stakersIndex[_user] = 0
+        self.s_stakerCount = lastIndex
+
+@internal
+@view
 def isTokenAllowed(_token: address) -> bool:
     """
     @notice Check if the token is allowed
     @param _token address of the token to check
     @return isAllowed true if allowed, false ether
+    @dev s_allowedTokensIndex stores the index + 1 of the token, 0 means not allowed
     """
-    if _token in self.s_allowedTokens:
-        return True
-    return False        
+    return self.s_allowedTokensIndex[_token] != 0
 
 @internal
 @view
@@ -163,8 +504,9 @@ def getUserTotalYieldRewards(_user: address) -> uint256:
     @return totalYieldReward total yield rewards of user
     """
     totalYieldReward: uint256 = 0
-    for allowedToken in self.s_allowedTokens:
-        totalYieldReward = totalYieldReward + self.getUserYieldRewardsByToken(_user, allowedToken)
+    userTokens: DynArray[address, 128] = self.s_userTokens[_user]
+    for token in userTokens:
+        totalYieldReward = totalYieldReward + self.getUserYieldRewardsByToken(_user, token)
     return totalYieldReward
 
 @internal
@@ -176,25 +518,231 @@ def getUserYieldRewardsByToken(_user: address, _token: address) -> uint256:
     @param _token address of the token
     @return rewards total rewards by specific token
     """
-    if self.s_uniqueTokensStaked[_user] <= 0:
+    balance: uint256 = self.getPositionBalance(self.s_positions[_token][_user])
+    if balance == 0:
+        return 0
+    return self.getUserRewardsAt(_user, _token, balance, self.getCurrentAccRewardPerShare(_token))
+
+@internal
+@view
+def getUserRewardsAt(_user: address, _token: address, _balance: uint256, _accRewardPerShare: uint256) -> uint256:
+    """
+    @notice Get the user rewards of a token for a given value of its reward accumulator
+    @param _user address of the user
+    @param _token address of the token
+    @param _balance balance staked by the user
+    @param _accRewardPerShare reward accumulator of the token
+    @return rewards rewards of the user since his last settlement
+    """
+    userRewardPerSharePaid: uint256 = self.s_userRewardPerSharePaid[_token][_user]
+    if _accRewardPerShare == userRewardPerSharePaid:
+        return 0
+    return (_balance * (_accRewardPerShare - userRewardPerSharePaid)) / (self.s_rate * PRICE_PRECISION * EMISSION_PRECISION)
+
+@internal
+@view
+def getCurrentAccRewardPerShare(_token: address) -> uint256:
+    """
+    @notice Get the reward accumulator of a token up to the current block
+    @param _token address of the token
+    @return accRewardPerShare reward accumulator of the token
+    @dev Removed tokens and tokens nobody stakes do not accrue
+    """
+    accRewardPerShare: uint256 = self.s_accRewardPerShare[_token]
+    lastRewardTime: uint256 = self.s_lastRewardTime[_token]
+    if block.timestamp > lastRewardTime and self.s_totalStaked[_token] != 0 and self.isTokenAllowed(_token):
+        accRewardPerShare += (self.getEmissionAt(block.timestamp) - self.getEmissionAt(lastRewardTime)) * (self.s_tokenPrices[_token] % PRICE_EPOCH_SHIFT)
+    return accRewardPerShare
+
+@internal
+def updatePool(_token: address) -> uint256:
+    """
+    @notice Update the reward accumulator of a token up to the current block and refresh its price
+    @param _token address of the token
+    @return accRewardPerShare reward accumulator of the token
+    @dev The elapsed time accrues at the cached price, which is then refreshed if a new epoch started.
+        The price of a removed token is not refreshed since it no longer accrues.
+    """
+    accRewardPerShare: uint256 = self.accruePool(_token)
+    if self.isTokenAllowed(_token):
+        self.updatePrice(_token)
+    return accRewardPerShare
+
+@internal
+def accruePool(_token: address) -> uint256:
+    """
+    @notice Update the reward accumulator of a token up to the current block at its cached price
+    @param _token address of the token
+    @return accRewardPerShare reward accumulator of the token
+    @dev The rewards accrued by all the stakers of the token are added to the total rewards accrued.
+        Removed tokens and tokens nobody stakes do not accrue. The price feed is not read.
+    """
+    accRewardPerShare: uint256 = self.s_accRewardPerShare[_token]
+    lastRewardTime: uint256 = self.s_lastRewardTime[_token]
+    if block.timestamp != lastRewardTime:
+        totalStaked: uint256 = self.s_totalStaked[_token]
+        if totalStaked != 0 and self.isTokenAllowed(_token):
+            increase: uint256 = (self.getEmissionAt(block.timestamp) - self.getEmissionAt(lastRewardTime)) * (self.s_tokenPrices[_token] % PRICE_EPOCH_SHIFT)
+            accRewardPerShare += increase
+            self.s_accRewardPerShare[_token] = accRewardPerShare
+            self.s_totalRewardsAccrued += (totalStaked * increase) / (self.s_rate * PRICE_PRECISION * EMISSION_PRECISION)
+        self.s_lastRewardTime[_token] = block.timestamp
+    return accRewardPerShare
+
+@internal
+@view
+def findRateCheckpoint(_time: uint256) -> uint256:
+    """
+    @notice Find the rate checkpoint applied at a given time
+    @param _time timestamp
+    @return index index + 1 of the last checkpoint starting at or before _time, 0 if there is none
+    @dev The last checkpoint is checked first, the others are found by binary search
+    """
+    count: uint256 = self.s_rateCheckpointCount
+    if count == 0:
+        return 0
+    if self.s_rateCheckpoints[count - 1] / RATE_CHECKPOINT_TIME_SHIFT <= _time:
+        return count
+    if self.s_rateCheckpoints[0] / RATE_CHECKPOINT_TIME_SHIFT > _time:
         return 0
-    price: uint256 = 0
-    decimals: uint256 = 0
-    (price, decimals) = self.getTokenValue(_token)
-    time: uint256 = self.calculateYieldTime(_user, _token) * (10**decimals)
-    timeRate: uint256 = time / i_rate
-    stakingPrice: uint256 = (self.s_stakingBalance[_token][_user] * price) / (10**decimals)
-    return ((stakingPrice * timeRate) / (10**decimals))
+    # Checkpoint low starts at or before _time, checkpoint high after _time
+    low: uint256 = 0
+    high: uint256 = count - 1
+    for i in range(MAX_RATE_SEARCH_STEPS):
+        if high - low <= 1:
+            break
+        middle: uint256 = (low + high) / 2
+        if self.s_rateCheckpoints[middle] / RATE_CHECKPOINT_TIME_SHIFT <= _time:
+            low = middle
+        else:
+            high = middle
+    return low + 1
 
 @internal
 @view
-def getTokenValue(_token: address) -> (uint256,uint256):
+def getEmissionAt(_time: uint256) -> uint256:
+    """
+    @notice Get the emission reached at a given time
+    @param _time timestamp
+    @return emission seconds elapsed since 0 weighted by s_rate / rate applied, multiplied by EMISSION_PRECISION
+    @dev Before the first checkpoint the emission is _time * EMISSION_PRECISION, so a farm keeping its initial rate
+        gives the exact same rewards as with a constant rate
+    """
+    index: uint256 = self.findRateCheckpoint(_time)
+    if index == 0:
+        return _time * EMISSION_PRECISION
+    checkpoint: uint256 = self.s_rateCheckpoints[index - 1]
+    elapsed: uint256 = _time - checkpoint / RATE_CHECKPOINT_TIME_SHIFT
+    return checkpoint % RATE_CHECKPOINT_TIME_SHIFT + (elapsed * EMISSION_PRECISION * self.s_rate) / self.s_rateCheckpointRates[index - 1]
+
+@internal
+def updatePrice(_token: address):
+    """
+    @notice Refresh the cached price of a token from its price feed if a new epoch started
+    @param _token address of the token
+    @dev Tokens without price feed keep a price of 0, the price is cached with PRICE_PRECISION decimals
+    """
+    epoch: uint256 = block.timestamp / PRICE_EPOCH
+    tokenPrice: uint256 = self.s_tokenPrices[_token]
+    if tokenPrice != 0 and tokenPrice / PRICE_EPOCH_SHIFT == epoch:
+        return
+    if self.s_tokenPriceFeeds[_token] == empty(address):
+        return
+    price: uint256 = self.getTokenValue(_token) * PRICE_PRECISION / self.s_tokenPriceScale[_token]
+    assert price < PRICE_EPOCH_SHIFT, "Price too high"
+    self.s_tokenPrices[_token] = epoch * PRICE_EPOCH_SHIFT + price
+
+@internal
+@view
+def canUpdatePrice(_token: address) -> bool:
+    """
+    @notice Check that updatePrice would not revert for a token
+    @param _token address of the token
+    @return canUpdate false if the price feed has to be read and reverts, returns a negative or a too high price
+    @dev The price feed is called with a static raw_call so its failure does not revert the caller
+    """
+    tokenPrice: uint256 = self.s_tokenPrices[_token]
+    if tokenPrice != 0 and tokenPrice / PRICE_EPOCH_SHIFT == block.timestamp / PRICE_EPOCH:
+        return True
+    priceFeedAddress: address = self.s_tokenPriceFeeds[_token]
+    if priceFeedAddress == empty(address):
+        return True
+    success: bool = False
+    response: Bytes[160] = b""
+    success, response = raw_call(
+        priceFeedAddress,
+        method_id("latestRoundData()"),
+        max_outsize=160,
+        is_static_call=True,
+        revert_on_failure=False
+    )
+    if not success or len(response) != 160:
+        return False
+    # The round ids are uint80, the call of getTokenValue reverts when they are out of range
+    if convert(slice(response, 0, 32), uint256) >= 2**80 or convert(slice(response, 128, 32), uint256) >= 2**80:
+        return False
+    answer: int256 = convert(slice(response, 32, 32), int256)
+    if answer < 0 or convert(answer, uint256) > max_value(uint256) / PRICE_PRECISION:
+        return False
+    return convert(answer, uint256) * PRICE_PRECISION / self.s_tokenPriceScale[_token] < PRICE_EPOCH_SHIFT
+
+@internal
+def settleRewards(_user: address, _token: address, _balance: uint256) -> uint256:
+    """
+    @notice Update the pool of a token and settle the rewards of a user for this token
+    @param _user address of the user
+    @param _token address of the token
+    @param _balance balance staked by the user before the settlement
+    @return rewards rewards of the user since his last settlement
+    """
+    accRewardPerShare: uint256 = self.updatePool(_token)
+    userRewardPerSharePaid: uint256 = self.s_userRewardPerSharePaid[_token][_user]
+    if accRewardPerShare == userRewardPerSharePaid:
+        return 0
+    self.s_userRewardPerSharePaid[_token][_user] = accRewardPerShare
+    if _balance == 0:
+        return 0
+    return (_balance * (accRewardPerShare - userRewardPerSharePaid)) / (self.s_rate * PRICE_PRECISION * EMISSION_PRECISION)
+
+@internal
+@pure
+def packPosition(_balance: uint256, _startTime: uint256) -> uint256:
+    """
+    @notice Pack the balance and the start time of a position in a single word
+    @param _balance balance of the position, lower than 2**192
+    @param _startTime start time of the position, lower than 2**64
+    @return position packed position
+    """
+    return _startTime * POSITION_TIME_SHIFT + _balance
+
+@internal
+@pure
+def getPositionBalance(_position: uint256) -> uint256:
+    """
+    @notice Get the balance of a packed position
+    @param _position packed position
+    @return balance balance of the position
+    """
+    return _position % POSITION_TIME_SHIFT
+
+@internal
+@pure
+def getPositionStartTime(_position: uint256) -> uint256:
+    """
+    @notice Get the start time of a packed position
+    @param _position packed position
+    @return startTime start time of the position
+    """
+    return _position / POSITION_TIME_SHIFT
+
+@internal
+@view
+def getTokenValue(_token: address) -> uint256:
     """
     @notice Get the last known value of the token thanks to Chainlink price feed
     @param _token address of the token
     @return price the last price
-    @return decimals decimals of the price
-    @dev Implements Chainlink price feed
+    @dev Implements Chainlink price feed, the decimals of the price are stored in s_tokenPriceScale
     """
     priceFeedAddress: address = self.s_tokenPriceFeeds[_token]
     priceFeed: AggregatorV3Interface = AggregatorV3Interface(priceFeedAddress)
@@ -204,21 +752,7 @@ def getTokenValue(_token: address) -> (uint256,uint256):
     c: uint256 = 0
     d: uint80 = 0
     (a,price,b,c,d) = priceFeed.latestRoundData()
-    decimals: uint8 = priceFeed.decimals()
-    return (convert(price, uint256), convert(decimals, uint256))
-
-@internal
-@view
-def calculateYieldTime(_user: address, _token: address) -> uint256:
-    """
-    @notice Calculate since how long the user stake a specific token
-    @param _user address of the user to check
-    @param _token address of the token to check
-    @return totalTime time since the user start to stake this token
-    """
-    end: uint256 = block.timestamp
-    totalTime: uint256 = end - self.s_startTime[_token][_user]
-    return totalTime
+    return convert(price, uint256)
 
 @external
 @view
@@ -230,6 +764,90 @@ def getTotalPendingRewards(_user: address) -> uint256:
     """
     return self.getUserTotalYieldRewards(_user) + self.s_cubeBalance[_user]
 
+@external
+@view
+def getPendingRewardsBatch(_users: DynArray[address, MAX_STAKERS_PAGE_SIZE]) -> DynArray[uint256, MAX_STAKERS_PAGE_SIZE]:
+    """
+    @notice Get the total of pending rewards of several users
+    @param _users addresses of the users
+    @return pendingRewards total of pending rewards of each user, Cube balance included
+    @dev The reward accumulator of each allowed token is computed once for all the users.
+        Removed tokens do not accrue so their stored accumulator is used.
+    """
+    allowedTokens: DynArray[address, 128] = self.s_allowedTokens
+    accRewardPerShares: DynArray[uint256, 128] = []
+    for token in allowedTokens:
+        accRewardPerShares.append(self.getCurrentAccRewardPerShare(token))
+    pendingRewards: DynArray[uint256, MAX_STAKERS_PAGE_SIZE] = []
+    for user in _users:
+        rewards: uint256 = self.s_cubeBalance[user]
+        userTokens: DynArray[address, 128] = self.s_userTokens[user]
+        for token in userTokens:
+            accRewardPerShare: uint256 = self.s_accRewardPerShare[token]
+            index: uint256 = self.s_allowedTokensIndex[token]
+            if index != 0:
+                accRewardPerShare = accRewardPerShares[index - 1]
+            balance: uint256 = self.getPositionBalance(self.s_positions[token][user])
+            rewards += self.getUserRewardsAt(user, token, balance, accRewardPerShare)
+        pendingRewards.append(rewards)
+    return pendingRewards
+
+@external
+@view
+def getUserPendingRewardsByToken(_user: address, _token: address) -> uint256:
+    """
+    @notice Get the pending rewards of a specific user for a specific token
+    @param _user address of the user
+    @param _token address of the token
+    @return pendingRewards pending rewards of the token
+    """
+    return self.getUserYieldRewardsByToken(_user, _token)
+
+@external
+@view
+def getUserPortfolio(_user: address) -> (DynArray[Position, 128], uint256, uint256):
+    """
+    @notice Get all the positions of a specific user with their pending rewards
+    @param _user address of the user
+    @return positions positions of the user
+    @return cubeBalance Cube balance of the user
+    @return totalPendingRewards total of pending rewards, Cube balance included
+    """
+    positions: DynArray[Position, 128] = []
+    cubeBalance: uint256 = self.s_cubeBalance[_user]
+    totalPendingRewards: uint256 = cubeBalance
+    userTokens: DynArray[address, 128] = self.s_userTokens[_user]
+    for token in userTokens:
+        position: uint256 = self.s_positions[token][_user]
+        pendingRewards: uint256 = self.getUserYieldRewardsByToken(_user, token)
+        totalPendingRewards += pendingRewards
+        positions.append(
+            Position({
+                token: token,
+                balance: self.getPositionBalance(position),
+                startTime: self.getPositionStartTime(position),
+                pendingRewards: pendingRewards
+            })
+        )
+    return (positions, cubeBalance, totalPendingRewards)
+
+@external
+@view
+def getTotalRewardsAccrued() -> uint256:
+    """
+    @notice Get the total of rewards accrued by all the stakers, claimed or not
+    @return totalRewardsAccrued total of rewards accrued
+    """
+    totalRewardsAccrued: uint256 = self.s_totalRewardsAccrued
+    for allowedToken in self.s_allowedTokens:
+        totalStaked: uint256 = self.s_totalStaked[allowedToken]
+        lastRewardTime: uint256 = self.s_lastRewardTime[allowedToken]
+        if totalStaked != 0 and block.timestamp > lastRewardTime:
+            price: uint256 = self.s_tokenPrices[allowedToken] % PRICE_EPOCH_SHIFT
+            emission: uint256 = self.getEmissionAt(block.timestamp) - self.getEmissionAt(lastRewardTime)
+            totalRewardsAccrued += (totalStaked * emission * price) / (self.s_rate * PRICE_PRECISION * EMISSION_PRECISION)
+    return totalRewardsAccrued
+
 @external
 @view
 def getCubeTokenAddress() -> address:
@@ -237,16 +855,40 @@ def getCubeTokenAddress() -> address:
     @notice Get Cube token address
     @return cubeTokenAddress Cube token address
     """
-    return i_cubeToken.address
+    return self.s_cubeToken.address
 
 @external
 @view
 def getRate() -> uint256:
     """
-    @notice Get the rate
+    @notice Get the rate applied now
     @return rate rate
     """
-    return i_rate
+    index: uint256 = self.findRateCheckpoint(block.timestamp)
+    if index == 0:
+        return self.s_rate
+    return self.s_rateCheckpointRates[index - 1]
+
+@external
+@view
+def getRateCheckpointCount() -> uint256:
+    """
+    @notice Get the number of rate changes scheduled
+    @return rateCheckpointCount number of rate checkpoints
+    """
+    return self.s_rateCheckpointCount
+
+@external
+@view
+def getRateCheckpoint(_index: uint256) -> (uint256, uint256):
+    """
+    @notice Get a rate change of the schedule
+    @param _index index of the checkpoint
+    @return timestamp timestamp from which the rate applies
+    @return rate rate
+    """
+    assert _index < self.s_rateCheckpointCount, "Invalid index"
+    return (self.s_rateCheckpoints[_index] / RATE_CHECKPOINT_TIME_SHIFT, self.s_rateCheckpointRates[_index])
 
 @external
 @view
@@ -267,7 +909,17 @@ def getUserTokenBalance(_user: address, _token: address) -> uint256:
     @param _token address of the token
     @return balance balance staked
     """
-    return self.s_stakingBalance[_token][_user]
+    return self.getPositionBalance(self.s_positions[_token][_user])
+
+@external
+@view
+def getTotalStaked(_token: address) -> uint256:
+    """
+    @notice Get the total balance of a specific token staked by all the users
+    @param _token address of the token
+    @return totalStaked total balance staked
+    """
+    return self.s_totalStaked[_token]
 
 @external
 @view
@@ -277,7 +929,17 @@ def getNumberOfTokenStaked(_user: address) -> uint256:
     @param _user address of the user
     @return numberOfTokens number of tokens
     """
-    return self.s_uniqueTokensStaked[_user]
+    return len(self.s_userTokens[_user])
+
+@external
+@view
+def getUserStakedTokens(_user: address) -> DynArray[address, 128]:
+    """
+    @notice Get the list of tokens a user stake
+    @param _user address of the user
+    @return stakedTokens address list of tokens staked
+    """
+    return self.s_userTokens[_user]
 
 @external
 @view
@@ -288,7 +950,7 @@ def getUserTokenStartTime(_user: address, _token: address) -> uint256:
     @param _token address of the token
     @return startTime start time from last staking
     """
-    return self.s_startTime[_token][_user]
+    return self.getPositionStartTime(self.s_positions[_token][_user])
 
 @external
 @view
@@ -302,12 +964,52 @@ def getUserCubeBalance(_user: address) -> uint256:
 
 @external
 @view
-def getStakers() -> DynArray[address, 1024]:
+def getStakers() -> DynArray[address, MAX_STAKERS_PAGE_SIZE]:
     """
     @notice Get the list of stakers
     @return stakers address list of stakers
+    @dev Only the first 1024 stakers are returned, use getStakersPage to go through all of them
+    """
+    return self.getStakersSlice(0, MAX_STAKERS_PAGE_SIZE)
+
+@external
+@view
+def getStakersPage(_offset: uint256, _limit: uint256) -> DynArray[address, MAX_STAKERS_PAGE_SIZE]:
+    """
+    @notice Get a page of the list of stakers
+    @param _offset index of the first staker of the page
+    @param _limit maximum number of stakers in the page, up to 1024
+    @return stakers address list of stakers in the page
+    """
+    return self.getStakersSlice(_offset, _limit)
+
+@external
+@view
+def getStakerCount() -> uint256:
+    """
+    @notice Get the number of stakers
+    @return stakerCount number of stakers
     """
-    return self.s_stakers
+    return self.s_stakerCount
+
+@internal
+@view
+def getStakersSlice(_offset: uint256, _limit: uint256) -> DynArray[address, MAX_STAKERS_PAGE_SIZE]:
+    """
+    @notice Get a slice of the list of stakers
+    @param _offset index of the first staker of the slice
+    @param _limit maximum number of stakers in the slice
+    @return stakers address list of stakers in the slice
+    """
+    stakers: DynArray[address, MAX_STAKERS_PAGE_SIZE] = []
+    stakerCount: uint256 = self.s_stakerCount
+    if _offset >= stakerCount:
+        return stakers
+    for i in range(MAX_STAKERS_PAGE_SIZE):
+        if i >= _limit or _offset + i >= stakerCount:
+            break
+        stakers.append(self.s_stakers[_offset + i])
+    return stakers
 
 @external
 @view
@@ -0,0 +1,87 @@
+# SPDX-License-Identifier: MIT
+# @version ^0.3.7
+
+interface CubeFarm:
+    def initialize(_cubeTokenAddress: address, _rate: uint256, _owner: address): nonpayable
+
+# @title CubeFarmFactory
+# @license MIT
+# @author jrmunchkin
+# @notice This contract deploys CubeFarm pools with different rates as minimal proxies (EIP-1167) of a single CubeFarm implementation.
+# @dev The constructor takes the address of a deployed CubeFarm used as implementation and the address of the CubeToken ERC20.
+#    The implementation is already initialized by its constructor so it cannot be taken over.
+#    Each farm created is initialized in the same transaction with the owner of the factory as owner.
+#    The minter role of the CubeToken contract should be granted to each farm after its creation.
+
+MAX_FARMS: constant(uint256) = 1024
+
+i_implementation: immutable(address)
+i_cubeToken: immutable(address)
+i_owner: immutable(address)
+s_farms: DynArray[address, MAX_FARMS]
+
+event FarmCreated:
+    farm: indexed(address)
+    rate: uint256
+
+@external
+def __init__(_implementation: address, _cubeTokenAddress: address):
+    """
+    @notice contructor
+    @param _implementation CubeFarm contract address used as implementation
+    @param _cubeTokenAddress CubeToken contract address
+    """
+    i_implementation = _implementation
+    i_cubeToken = _cubeTokenAddress
+    i_owner = msg.sender
+
+@external
+def createFarm(_rate: uint256) -> address:
+    """
+    @notice Create a new farm
+    @param _rate rate in seconds for calculating the rewards of the farm
+    @return farm address of the farm
+    @dev log an event FarmCreated when the farm is created
+    """
+    assert msg.sender == i_owner, "Only owner can create farm"
+    farm: address = create_minimal_proxy_to(i_implementation)
+    CubeFarm(farm).initialize(i_cubeToken, _rate, msg.sender)
+    self.s_farms.append(farm)
+    log FarmCreated(farm, _rate)
+    return farm
+
+@external
+@view
+def getFarms() -> DynArray[address, MAX_FARMS]:
+    """
+    @notice Get the list of farms created
+    @return farms address list of farms
+    """
+    return self.s_farms
+
+@external
+@view
+def getFarmCount() -> uint256:
+    """
+    @notice Get the number of farms created
+    @return farmCount number of farms
+    """
+    return len(self.s_farms)
+
+@external
+@view
+def getImplementation() -> address:
+    """
+    @notice Get the CubeFarm implementation address
+    @return implementation implementation address
+    """
+    return i_implementation
+
+@external
+@view
+def getCubeTokenAddress() -> address:
+    """
+    @notice Get Cube token address
+    @return cubeTokenAddress Cube token address
+    """
+    return i_cubeToken
@@ -9,17 +9,28 @@ implements: ERC20
 # @license MIT
 # @author jrmunchkin
 # @notice A simple ERC20 token with specific MINTER_ROLE for minter.
+# @dev Implements EIP-2612 permit to approve with a signature.
+#    mintBatch and transferBatch credit up to MAX_BATCH addresses in one call, with one Transfer event each.
 
 DEFAULT_ADMIN_ROLE: public(constant(bytes32)) = keccak256('DEFAULT_ADMIN_ROLE')
 MINTER_ROLE: public(constant(bytes32)) = keccak256('MINTER_ROLE')
+VERSION: constant(String[8]) = "1"
+MAX_BATCH: constant(uint256) = 1024
+EIP712_DOMAIN_TYPEHASH: constant(bytes32) = keccak256('EIP712Domain(string name,string version,uint256 chainId,address verifyingContract)')
+PERMIT_TYPEHASH: constant(bytes32) = keccak256('Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)')
+# Half of the order of secp256k1, a higher s is the malleable twin of a valid signature
+SECP256K1N_HALF: constant(uint256) = 57896044618658097711785492504343953926418782139537452191302581570759080747168
 
 i_name: immutable(String[64])
 i_symbol: immutable(String[32])
 i_decimals: immutable(uint256)
+i_chainId: immutable(uint256)
+i_domainSeparator: immutable(bytes32)
 s_totalSupply: uint256
 s_roles: HashMap[bytes32, HashMap[address, bool]]
 s_balances: HashMap[address, uint256]
 s_allowances: HashMap[address, HashMap[address, uint256]]
+s_nonces: HashMap[address, uint256]
 
 event Transfer:
     sender: indexed(address)
@@ -41,6 +52,8 @@ def __init__():
     i_decimals = 18
     self.s_totalSupply = 0
     self.s_roles[DEFAULT_ADMIN_ROLE][msg.sender] = True
+    i_chainId = chain.id
+    i_domainSeparator = self.computeDomainSeparator()
     
 @external
 def approve(_spender: address, _amount: uint256) -> bool:
@@ -55,6 +68,37 @@ def approve(_spender: address, _amount: uint256) -> bool:
     log Approval(msg.sender, _spender, _amount)
     return True
 
+@external
+def permit(_owner: address, _spender: address, _amount: uint256, _deadline: uint256, _v: uint8, _r: bytes32, _s: bytes32):
+    """
+    @notice Set allowance amount for spender with a signature of the owner (EIP-2612)
+    @param _owner address of the owner
+    @param _spender address of the spender
+    @param _amount amount to approve
+    @param _deadline timestamp until which the signature is valid
+    @param _v v of the signature
+    @param _r r of the signature
+    @param _s s of the signature
+    @dev Returns nothing like the EIP, only signatures with s in the lower half of the curve order are accepted.
+        log an event Approval when token is approved
+    """
+    assert _owner != empty(address), "Invalid owner"
+    assert _deadline >= block.timestamp, "Permit expired"
+    assert convert(_s, uint256) <= SECP256K1N_HALF, "Invalid signature s"
+    nonce: uint256 = self.s_nonces[_owner]
+    digest: bytes32 = keccak256(
+        concat(
+            b"\x19\x01",
+            self.getDomainSeparator(),
+            keccak256(_abi_encode(PERMIT_TYPEHASH, _owner, _spender, _amount, nonce, _deadline))
+        )
+    )
+    signer: address = ecrecover(digest, convert(_v, uint256), convert(_r, uint256), convert(_s, uint256))
+    assert signer == _owner, "Invalid signature"
+    self.s_nonces[_owner] = nonce + 1
+    self.s_allowances[_owner][_spender] = _amount
+    log Approval(_owner, _spender, _amount)
+
 @external
 def mint(_to: address, _amount: uint256) -> bool:
     """
@@ -69,6 +113,27 @@ def mint(_to: address, _amount: uint256) -> bool:
     log Transfer(empty(address), _to, _amount)
     return True
 
+@external
+def mintBatch(_recipients: DynArray[address, MAX_BATCH], _amounts: DynArray[uint256, MAX_BATCH]) -> bool:
+    """
+    @notice Allow minter to mint tokens to several addresses
+    @param _recipients addresses of the receivers
+    @param _amounts amounts to mint, one for each receiver
+    @return success
+    @dev log an event Transfer for each receiver, the role is checked and the total supply written once
+    """
+    assert self.s_roles[MINTER_ROLE][msg.sender], "Sender is not the minter"
+    assert len(_recipients) == len(_amounts), "Length mismatch"
+    totalMinted: uint256 = 0
+    for i in range(MAX_BATCH):
+        if i >= len(_recipients):
+            break
+        totalMinted += _amounts[i]
+        self.s_balances[_recipients[i]] += _amounts[i]
+        log Transfer(empty(address), _recipients[i], _amounts[i])
+    self.s_totalSupply += totalMinted
+    return True
+
 @external
 def grantRole(_role: bytes32, _to: address) -> bool:
     """
@@ -106,6 +171,29 @@ def transfer(_to: address, _amount: uint256) -> bool:
     self._transfer(msg.sender, _to, _amount)
     return True
 
+@external
+def transferBatch(_recipients: DynArray[address, MAX_BATCH], _amounts: DynArray[uint256, MAX_BATCH]) -> bool:
+    """
+    @notice Transfer from sender to several addresses
+    @param _recipients addresses of the receivers
+    @param _amounts amounts to transfer, one for each receiver
+    @return success
+    @dev log an event Transfer for each receiver, the balance of the sender is debited once with the total
+    """
+    assert len(_recipients) == len(_amounts), "Length mismatch"
+    totalAmount: uint256 = 0
+    for amount in _amounts:
+        totalAmount += amount
+    assert self.s_balances[msg.sender] >= totalAmount, "Insufficient balance"
+    # Debited before crediting so a transfer to the sender itself is still counted
+    self.s_balances[msg.sender] -= totalAmount
+    for i in range(MAX_BATCH):
+        if i >= len(_recipients):
+            break
+        self.s_balances[_recipients[i]] += _amounts[i]
+        log Transfer(msg.sender, _recipients[i], _amounts[i])
+    return True
+
 @external
 def transferFrom(_from: address, _to: address, _amount: uint256) -> bool:
     """
@@ -134,6 +222,29 @@ def _transfer(_from: address, _to: address, _amount: uint256):
     self.s_balances[_to] += _amount
     log Transfer(_from, _to, _amount)
 
+@internal
+@view
+def computeDomainSeparator() -> bytes32:
+    """
+    @notice Compute the EIP-712 domain separator for the current chain
+    @return domainSeparator domain separator
+    """
+    return keccak256(
+        _abi_encode(EIP712_DOMAIN_TYPEHASH, keccak256("Cube Token"), keccak256(VERSION), chain.id, self)
+    )
+
+@internal
+@view
+def getDomainSeparator() -> bytes32:
+    """
+    @notice Get the EIP-712 domain separator
+    @return domainSeparator domain separator
+    @dev The domain separator computed at deployment is only recomputed if the chain id changed (fork)
+    """
+    if chain.id == i_chainId:
+        return i_domainSeparator
+    return self.computeDomainSeparator()
+
 @external
 @view
 def hasRole(_role: bytes32, _to: address) -> bool:
@@ -175,6 +286,25 @@ def totalSupply() -> uint256:
     """
     return self.s_totalSupply
 
+@external
+@view
+def nonces(_owner: address) -> uint256:
+    """
+    @notice Get the current permit nonce of a specific address
+    @param _owner address to check
+    @return nonce current nonce
+    """
+    return self.s_nonces[_owner]
+
+@external
+@view
+def DOMAIN_SEPARATOR() -> bytes32:
+    """
+    @notice Get the EIP-712 domain separator used by permit
+    @return domainSeparator domain separator
+    """
+    return self.getDomainSeparator()
+
 @external
 @view
 def name() -> String[64]:
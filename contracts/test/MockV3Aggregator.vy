@@ -11,6 +11,8 @@ getStartedAt: public(HashMap[uint256, uint256])
 
 supply: uint256
 decimals: public(uint8)
+# Makes latestRoundData revert like a deprecated feed
+reverting: public(bool)
 
 @external
 def __init__(_decimals: uint8, _initialAnswer: int256):
@@ -26,6 +28,10 @@ def updateRoundData(_roundId: uint256, _answer: int256, _timestamp: uint256, _st
     self.getTimestamp[self.latestRound] = _timestamp
     self.getStartedAt[self.latestRound] = _startedAt
 
+@external
+def setReverting(_reverting: bool):
+    self.reverting = _reverting
+
 @internal
 def updateAnswer(_answer: int256):
     self.latestAnswer = _answer
@@ -43,4 +49,5 @@ def getRoundData(_roundId: uint256) -> (uint256, int256, uint256, uint256, uint2
 @external
 @view 
 def latestRoundData() -> (uint256, int256, uint256, uint256, uint256): 
+    assert not self.reverting, "Price feed reverting"
     return (self.latestRound, self.getAnswer[self.latestRound], self.getStartedAt[self.latestRound], self.getTimestamp[self.latestRound], self.latestRound)
\ No newline at end of file
@@ -48,6 +48,12 @@ def transferFrom(_from: address, _to: address, _amount: uint256) -> bool:
     self._transfer(_from, _to, _amount)
     return True
 
+@external
+def mint(_to: address, _amount: uint256):
+    self.totalSupply += _amount
+    self.balances[_to] += _amount
+    log Transfer(empty(address), _to, _amount)
+
 @internal
 def _transfer(_from: address, _to: address, _amount: uint256):
     assert self.balances[_from] >= _amount, "Insufficient balance"
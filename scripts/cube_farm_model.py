@@ -0,0 +1,402 @@
+# In-memory model of CubeFarm following the same integer math and the same order of operations,
+# so its state can be compared with the contract after every transaction.
+# Owner checks are not modelled, every call is assumed to come from the right account.
+import bisect
+
+MAX_UINT256 = 2**256 - 1
+MAX_POSITION_BALANCE = 2**192 - 1
+PRICE_EPOCH = 3600
+EMISSION_PRECISION = 10**9
+PRICE_PRECISION = 10**18
+MAX_EMISSION = 2**192 - 1
+
+
+class ModelRevert(Exception):
+    # Raised with the revert message of the contract, None for a revert without message (overflow)
+    def __init__(self, revert_msg=None):
+        super().__init__(revert_msg)
+        self.revert_msg = revert_msg
+
+
+class CubeFarmModel:
+    def __init__(self, cube_token, rate, now=0):
+        self.cube_token = cube_token
+        self.rate = rate
+        self.now = now
+        self.allowed_tokens = []
+        self.price_feeds = {}
+        self.price_scale = {}
+        # Cached (price with PRICE_PRECISION decimals, epoch) of each token
+        self.token_prices = {}
+        # Price and decimals of each price feed
+        self.feeds = {}
+        self.stakers = []
+        self.user_tokens = {}
+        self.cube_balance = {}
+        # (balance, start time) by (token, user)
+        self.positions = {}
+        self.reward_per_share_paid = {}
+        self.acc_reward_per_share = {}
+        self.last_reward_time = {}
+        self.total_staked = {}
+        self.total_rewards_accrued = 0
+        # (timestamp, emission at timestamp, rate) of each rate change
+        self.rate_checkpoints = []
+        # ERC20 balances by (token, user), the farm balance is not tracked
+        self.token_balances = {}
+
+    # Model setup, not part of CubeFarm
+
+    def set_feed(self, price_feed, price, decimals):
+        self.feeds[price_feed] = (price, decimals)
+
+    def mint(self, token, user, amount):
+        key = (token, user)
+        self.token_balances[key] = uint256(self.token_balances.get(key, 0) + amount)
+
+    def transact(self, function_name, *args):
+        # Runs a transaction, the state is left untouched if it reverts like on chain
+        state = {
+            name: value.copy() if isinstance(value, (dict, list)) else value
+            for name, value in self.__dict__.items()
+        }
+        # The only nested mutable values are the token lists of the users
+        state["user_tokens"] = {
+            user: list(tokens) for user, tokens in self.user_tokens.items()
+        }
+        try:
+            return getattr(self, function_name)(*args)
+        except ModelRevert:
+            self.__dict__ = state
+            raise
+
+    # External functions
+
+    def set_price_feed_contract(self, token, price_feed):
+        self.accrue_pool(token)
+        self.price_feeds[token] = price_feed
+        decimals = self.feeds[price_feed][1] if price_feed is not None else 0
+        self.price_scale[token] = 10**decimals
+        self.token_prices.pop(token, None)
+        self.update_price(token)
+
+    def schedule_rate(self, timestamp, rate):
+        require(rate != 0, "Invalid rate")
+        require(timestamp >= self.now, "Cannot schedule rate in the past")
+        if self.rate_checkpoints:
+            require(
+                timestamp > self.rate_checkpoints[-1][0],
+                "Timestamp before last checkpoint",
+            )
+        require(timestamp < 2**64, "Timestamp too high")
+        emission = self.get_emission_at(timestamp)
+        require(emission <= MAX_EMISSION, "Emission too high")
+        self.rate_checkpoints.append((timestamp, emission, rate))
+
+    def poke_prices(self):
+        for token in list(self.allowed_tokens):
+            if self.can_update_price(token):
+                self.update_pool(token)
+            else:
+                self.accrue_pool(token)
+
+    def add_allowed_token(self, token):
+        require(not self.is_token_allowed(token), "Token already allowed")
+        self.allowed_tokens.append(token)
+        self.last_reward_time[token] = self.now
+
+    def remove_allowed_token(self, token):
+        require(self.is_token_allowed(token), "Token not allowed")
+        self.accrue_pool(token)
+        # Same swap and pop as the contract to keep the same order
+        index = self.allowed_tokens.index(token)
+        self.allowed_tokens[index] = self.allowed_tokens[-1]
+        self.allowed_tokens.pop()
+
+    def stake_tokens(self, user, amount, token):
+        was_staker = len(self.get_user_tokens(user)) != 0
+        self.stake(user, token, amount)
+        self.update_staker(user, was_staker)
+
+    def stake_many(self, user, stakes):
+        was_staker = len(self.get_user_tokens(user)) != 0
+        for token, amount in stakes:
+            self.stake(user, token, amount)
+        self.update_staker(user, was_staker)
+
+    def unstake_tokens(self, user, amount, token):
+        self.unstake(user, token, amount)
+        self.update_staker(user, True)
+
+    def unstake_many(self, user, unstakes):
+        was_staker = len(self.get_user_tokens(user)) != 0
+        for token, amount in unstakes:
+            self.unstake(user, token, amount)
+        self.update_staker(user, was_staker)
+
+    def exit_all(self, user):
+        user_tokens = list(self.get_user_tokens(user))
+        require(len(user_tokens) > 0, "No tokens to unstake")
+        for token in user_tokens:
+            self.unstake(user, token, self.get_user_token_balance(user, token))
+        self.update_staker(user, True)
+        if self.cube_balance.get(user, 0) != 0:
+            self.claim_rewards(user, [])
+
+    def claim_yield_rewards(self, user):
+        self.claim_rewards(user, list(self.get_user_tokens(user)))
+
+    def claim_yield_rewards_for(self, user, tokens):
+        self.claim_rewards(user, tokens)
+
+    def compound(self, user):
+        require(
+            self.is_token_allowed(self.cube_token), "Cannot stake not allowed token"
+        )
+        was_staker = len(self.get_user_tokens(user)) != 0
+        to_compound = self.collect_rewards(user, list(self.get_user_tokens(user)))
+        require(to_compound > 0, "No rewards to transfer")
+        self.add_to_position(user, self.cube_token, to_compound)
+        self.update_staker(user, was_staker)
+
+    # Internal functions
+
+    def stake(self, user, token, amount):
+        require(amount > 0, "Cannot stake amount 0")
+        require(
+            self.token_balances.get((token, user), 0) >= amount, "Not enough balance"
+        )
+        require(self.is_token_allowed(token), "Cannot stake not allowed token")
+        self.add_to_position(user, token, amount)
+        self.token_balances[(token, user)] -= amount
+
+    def add_to_position(self, user, token, amount):
+        user_balance = self.get_user_token_balance(user, token)
+        require(
+            user_balance + amount <= MAX_POSITION_BALANCE,
+            "Cannot stake more than max balance",
+        )
+        if user_balance == 0:
+            self.user_tokens.setdefault(user, []).append(token)
+        to_transfer = self.settle_rewards(user, token, user_balance)
+        if to_transfer != 0:
+            self.cube_balance[user] = uint256(
+                self.cube_balance.get(user, 0) + to_transfer
+            )
+        self.positions[(token, user)] = (user_balance + amount, self.now)
+        self.total_staked[token] = uint256(self.total_staked.get(token, 0) + amount)
+
+    def unstake(self, user, token, amount):
+        user_balance = self.get_user_token_balance(user, token)
+        require(user_balance > 0, "Cannot unstake 0 blance")
+        require(user_balance >= amount, "Cannot unstake more than user balance")
+        to_transfer = self.settle_rewards(user, token, user_balance)
+        self.positions[(token, user)] = (user_balance - amount, self.now)
+        self.total_staked[token] -= amount
+        if to_transfer != 0:
+            self.cube_balance[user] = uint256(
+                self.cube_balance.get(user, 0) + to_transfer
+            )
+        if user_balance == amount:
+            self.remove_user_token(user, token)
+        self.mint(token, user, amount)
+
+    def claim_rewards(self, user, tokens):
+        to_transfer = self.collect_rewards(user, tokens)
+        require(to_transfer > 0, "No rewards to transfer")
+        self.mint(self.cube_token, user, to_transfer)
+
+    def collect_rewards(self, user, tokens):
+        rewards = 0
+        for token in tokens:
+            balance = self.get_user_token_balance(user, token)
+            if balance > 0:
+                rewards = uint256(rewards + self.settle_rewards(user, token, balance))
+                self.positions[(token, user)] = (balance, self.now)
+        if self.cube_balance.get(user, 0) != 0:
+            rewards = uint256(rewards + self.cube_balance[user])
+            self.cube_balance[user] = 0
+        return rewards
+
+    def remove_user_token(self, user, token):
+        user_tokens = self.user_tokens[user]
+        index = user_tokens.index(token)
+        user_tokens[index] = user_tokens[-1]
+        user_tokens.pop()
+
+    def update_staker(self, user, was_staker):
+        is_staker = len(self.get_user_tokens(user)) != 0
+        if is_staker and not was_staker:
+            self.stakers.append(user)
+        elif was_staker and not is_staker:
+            index = self.stakers.index(user)
+            self.stakers[index] = self.stakers[-1]
+            self.stakers.pop()
+
+    def is_token_allowed(self, token):
+        return token in self.allowed_tokens
+
+    def get_token_value(self, token):
+        return self.feeds[self.price_feeds.get(token)][0]
+
+    def find_rate_checkpoint(self, time):
+        # Index + 1 of the last checkpoint starting at or before time, 0 if there is none
+        return bisect.bisect_right(
+            [timestamp for timestamp, _, _ in self.rate_checkpoints], time
+        )
+
+    def get_emission_at(self, time):
+        index = self.find_rate_checkpoint(time)
+        if index == 0:
+            return uint256(time * EMISSION_PRECISION)
+        timestamp, emission, rate = self.rate_checkpoints[index - 1]
+        return uint256(
+            emission
+            + uint256((time - timestamp) * EMISSION_PRECISION * self.rate) // rate
+        )
+
+    def get_cached_price(self, token):
+        return self.token_prices.get(token, (0, 0))[0]
+
+    def get_current_acc_reward_per_share(self, token):
+        acc_reward_per_share = self.acc_reward_per_share.get(token, 0)
+        last_reward_time = self.last_reward_time.get(token, 0)
+        if (
+            self.now > last_reward_time
+            and self.total_staked.get(token, 0) != 0
+            and self.is_token_allowed(token)
+        ):
+            acc_reward_per_share = uint256(
+                acc_reward_per_share
+                + uint256(
+                    (
+                        self.get_emission_at(self.now)
+                        - self.get_emission_at(last_reward_time)
+                    )
+                    * self.get_cached_price(token)
+                )
+            )
+        return acc_reward_per_share
+
+    def update_pool(self, token):
+        acc_reward_per_share = self.accrue_pool(token)
+        if self.is_token_allowed(token):
+            self.update_price(token)
+        return acc_reward_per_share
+
+    def accrue_pool(self, token):
+        acc_reward_per_share = self.acc_reward_per_share.get(token, 0)
+        last_reward_time = self.last_reward_time.get(token, 0)
+        if self.now != last_reward_time:
+            total_staked = self.total_staked.get(token, 0)
+            if total_staked != 0 and self.is_token_allowed(token):
+                increase = uint256(
+                    (
+                        self.get_emission_at(self.now)
+                        - self.get_emission_at(last_reward_time)
+                    )
+                    * self.get_cached_price(token)
+                )
+                acc_reward_per_share = uint256(acc_reward_per_share + increase)
+                self.acc_reward_per_share[token] = acc_reward_per_share
+                self.total_rewards_accrued = uint256(
+                    self.total_rewards_accrued
+                    + uint256(total_staked * increase)
+                    // (self.rate * PRICE_PRECISION * EMISSION_PRECISION)
+                )
+            self.last_reward_time[token] = self.now
+        return acc_reward_per_share
+
+    def can_update_price(self, token):
+        # The model feeds do not revert, only their price can make update_price revert
+        epoch = self.now // PRICE_EPOCH
+        if token in self.token_prices and self.token_prices[token][1] == epoch:
+            return True
+        if self.price_feeds.get(token) is None:
+            return True
+        value = self.get_token_value(token)
+        return (
+            0 <= value <= MAX_UINT256 // PRICE_PRECISION
+            and value * PRICE_PRECISION // self.price_scale[token] < 2**192
+        )
+
+    def update_price(self, token):
+        epoch = self.now // PRICE_EPOCH
+        if token in self.token_prices and self.token_prices[token][1] == epoch:
+            return
+        if self.price_feeds.get(token) is None:
+            return
+        price = (
+            uint256(self.get_token_value(token) * PRICE_PRECISION)
+            // self.price_scale[token]
+        )
+        require(price < 2**192, "Price too high")
+        self.token_prices[token] = (price, epoch)
+
+    def settle_rewards(self, user, token, balance):
+        acc_reward_per_share = self.update_pool(token)
+        paid = self.reward_per_share_paid.get((token, user), 0)
+        if acc_reward_per_share == paid:
+            return 0
+        self.reward_per_share_paid[(token, user)] = acc_reward_per_share
+        if balance == 0:
+            return 0
+        return uint256(balance * (acc_reward_per_share - paid)) // (
+            self.rate * PRICE_PRECISION * EMISSION_PRECISION
+        )
+
+    # Views
+
+    def get_rate(self):
+        index = self.find_rate_checkpoint(self.now)
+        if index == 0:
+            return self.rate
+        return self.rate_checkpoints[index - 1][2]
+
+    def get_user_tokens(self, user):
+        return self.user_tokens.get(user, [])
+
+    def get_user_token_balance(self, user, token):
+        return self.positions.get((token, user), (0, 0))[0]
+
+    def get_user_token_start_time(self, user, token):
+        return self.positions.get((token, user), (0, 0))[1]
+
+    def get_user_cube_balance(self, user):
+        return self.cube_balance.get(user, 0)
+
+    def get_number_of_token_staked(self, user):
+        return len(self.get_user_tokens(user))
+
+    def get_total_staked(self, token):
+        return self.total_staked.get(token, 0)
+
+    def get_user_yield_rewards_by_token(self, user, token):
+        balance = self.get_user_token_balance(user, token)
+        if balance == 0:
+            return 0
+        acc_reward_per_share = self.get_current_acc_reward_per_share(token)
+        paid = self.reward_per_share_paid.get((token, user), 0)
+        if acc_reward_per_share == paid:
+            return 0
+        return uint256(balance * (acc_reward_per_share - paid)) // (
+            self.rate * PRICE_PRECISION * EMISSION_PRECISION
+        )
+
+    def get_total_pending_rewards(self, user):
+        total = 0
+        for token in self.get_user_tokens(user):
+            total = uint256(total + self.get_user_yield_rewards_by_token(user, token))
+        return uint256(total + self.get_user_cube_balance(user))
+
+
+def require(condition, revert_msg):
+    if not condition:
+        raise ModelRevert(revert_msg)
+
+
+def uint256(value):
+    # Checked arithmetic like Vyper, a result out of range reverts the transaction
+    if value < 0 or value > MAX_UINT256:
+        raise ModelRevert()
+    return value
@@ -1,20 +1,69 @@
-from brownie import CubeToken, CubeFarm, network, config
+from brownie import (
+    CubeToken,
+    CubeFarm,
+    CubeFarmFactory,
+    Contract,
+    network,
+    config,
+    web3,
+)
 from scripts.helper import (
     get_contract,
     get_account,
     RATE,
+    LOCAL_BLOCKCHAIN_ENV,
+    FORKED_BLOCKCHAIN_ENV,
 )
+from scripts.submitter import Submitter
+import json
+import os
+
+ADDRESS_BOOK_FOLDER = "./deployments"
 
 
 def main():
-    deploy()
-    setup_cube_farm()
+    cube_token, cube_farm = deploy_or_load()
+    setup_cube_farm(cube_token, cube_farm)
 
 
 def deploy():
-    cube_token = deploy_cube_token()
-    cube_farm = deploy_cube_farm(cube_token)
-    return cube_token, cube_farm
+    # Both deployments are sent back-to-back, the constructor of CubeFarm only stores the future
+    # CubeToken address without calling it so its gas estimation does not need CubeToken to be mined
+    submitter = Submitter(get_account())
+    cube_token_address = submitter.deploy(CubeToken)
+    cube_farm_address = submitter.deploy(CubeFarm, cube_token_address, RATE)
+    submitter.wait_all()
+    return CubeToken.at(cube_token_address), CubeFarm.at(cube_farm_address)
+
+
+def deploy_or_load():
+    # Only deploys the contracts missing from the address book of the active network
+    address_book = load_address_book()
+    cube_token_address = address_book.get("CubeToken")
+    cube_farm_address = address_book.get("CubeFarm")
+    if not is_deployed(cube_token_address):
+        # A new CubeToken needs a new CubeFarm
+        cube_token_address = None
+        cube_farm_address = None
+    submitter = Submitter(get_account())
+    if cube_token_address is None:
+        cube_token_address = submitter.deploy(CubeToken)
+    if not is_deployed(cube_farm_address):
+        cube_farm_address = submitter.deploy(CubeFarm, cube_token_address, RATE)
+    try:
+        submitter.wait_all()
+    finally:
+        # Keep whatever was deployed so a failed run does not deploy it again
+        address_book = {
+            name: address
+            for name, address in (
+                ("CubeToken", cube_token_address),
+                ("CubeFarm", cube_farm_address),
+            )
+            if is_deployed(address)
+        }
+        save_address_book(address_book)
+    return CubeToken.at(cube_token_address), CubeFarm.at(cube_farm_address)
 
 
 def deploy_cube_token():
@@ -29,10 +78,33 @@ def deploy_cube_farm(cube_token):
     return cube_farm
 
 
-def setup_cube_farm():
+def deploy_cube_farm_factory(cube_token, cube_farm):
+    # cube_farm is the implementation cloned by every farm of the factory
+    account = get_account()
+    cube_farm_factory = CubeFarmFactory.deploy(
+        cube_farm.address, cube_token.address, {"from": account}
+    )
+    return cube_farm_factory
+
+
+def create_farm(cube_token, cube_farm_factory, rate=RATE):
+    # A clone has no artifact of its own, it is loaded with the ABI of CubeFarm.
+    # The address is read from the event since return values need tracing on live networks
+    account = get_account()
+    tx = cube_farm_factory.createFarm(rate, {"from": account})
+    tx.wait(1)
+    farm_address = tx.events["FarmCreated"]["farm"]
+    cube_farm = Contract.from_abi("CubeFarm", farm_address, CubeFarm.abi)
+    cube_token.grantRole(cube_token.MINTER_ROLE(), cube_farm, {"from": account}).wait(1)
+    return cube_farm
+
+
+def setup_cube_farm(cube_token=None, cube_farm=None):
     account = get_account()
-    cube_token = CubeToken[-1]
-    cube_farm = CubeFarm[-1]
+    if cube_token is None:
+        cube_token = CubeToken[-1]
+    if cube_farm is None:
+        cube_farm = CubeFarm[-1]
     # Add the allowed tokens and their price feed
     dict_allowed_tokens = {
         get_contract("weth_token"): get_contract("eth_usd_price_feed"),
@@ -40,16 +112,57 @@ def setup_cube_farm():
         get_contract("link_token"): get_contract("link_usd_price_feed"),
         cube_token: get_contract("dai_usd_price_feed"),
     }
+    # Only send what differs from the current state of the farm
+    allowed_tokens = cube_farm.getAllowedTokens()
+    # Every transaction is sent before waiting, the nonces execute them in order
+    submitter = Submitter(account)
+    added_tokens = []
     for allowed_token in dict_allowed_tokens:
-        allowedTokenTx = cube_farm.addAllowedToken(
-            allowed_token.address, {"from": account}
-        )
-        allowedTokenTx.wait(1)
-        setPriceFeedTx = cube_farm.setPriceFeedContract(
-            allowed_token.address, dict_allowed_tokens[allowed_token], {"from": account}
-        )
-        setPriceFeedTx.wait(1)
+        if allowed_token.address not in allowed_tokens:
+            submitter.send(cube_farm.addAllowedToken, allowed_token.address)
+            added_tokens.append(allowed_token)
     # Transfer the minter role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
-    grantTx = cube_token.grantRole(minter_role, cube_farm.address, {"from": account})
-    grantTx.wait(1)
+    if not cube_token.hasRole(minter_role, cube_farm.address):
+        submitter.send(cube_token.grantRole, minter_role, cube_farm.address)
+    # setPriceFeedContract is estimated before the pending addAllowedToken run, which gives the same gas
+    # unless a token removed while still staked is allowed again: it then accrues its stakers' rewards
+    transactions = []
+    if any(cube_farm.getTotalStaked(token) != 0 for token in added_tokens):
+        transactions = submitter.wait_all()
+    for allowed_token in dict_allowed_tokens:
+        price_feed = dict_allowed_tokens[allowed_token]
+        if cube_farm.getPriceFeedContract(allowed_token.address) != price_feed.address:
+            submitter.send(
+                cube_farm.setPriceFeedContract, allowed_token.address, price_feed
+            )
+    return transactions + submitter.wait_all()
+
+
+def is_deployed(address):
+    return address is not None and len(web3.eth.get_code(address)) > 0
+
+
+def get_address_book_path():
+    return os.path.join(ADDRESS_BOOK_FOLDER, f"{network.show_active()}.json")
+
+
+def load_address_book():
+    # Local and forked chains do not outlive the session so nothing is persisted for them
+    active_network = network.show_active()
+    if active_network in LOCAL_BLOCKCHAIN_ENV + FORKED_BLOCKCHAIN_ENV:
+        return {}
+    path = get_address_book_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as address_book_file:
+        return json.load(address_book_file)
+
+
+def save_address_book(address_book):
+    active_network = network.show_active()
+    if active_network in LOCAL_BLOCKCHAIN_ENV + FORKED_BLOCKCHAIN_ENV:
+        return
+    os.makedirs(ADDRESS_BOOK_FOLDER, exist_ok=True)
+    with open(get_address_book_path(), "w") as address_book_file:
+        json.dump(address_book, address_book_file, indent=2)
@@ -0,0 +1,86 @@
+from brownie import chain
+from scripts.helper import get_account, RATE
+from scripts.deploy import deploy, setup_cube_farm
+from web3 import Web3
+import json
+import os
+
+AMOUNT = Web3.toWei(1, "ether")
+BASELINE_PATH = "./reports/gas_benchmark.json"
+
+
+def main(baseline_path=None):
+    # With a baseline saved by save_baseline on the previous version of the contracts,
+    # the gas of both versions is printed side by side
+    gas_used = benchmark_operations()
+    baseline = None
+    if baseline_path is not None:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+    print_gas_report(gas_used, baseline)
+
+
+def save_baseline(baseline_path=BASELINE_PATH):
+    gas_used = benchmark_operations()
+    print_gas_report(gas_used)
+    os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+    with open(baseline_path, "w") as baseline_file:
+        json.dump(gas_used, baseline_file, indent=2)
+
+
+def benchmark_operations(amount=AMOUNT):
+    return {name: tx.gas_used for name, tx in run_operations(amount)}
+
+
+def run_operations(amount=AMOUNT):
+    # Returns the (name, transaction) of each operation so they can also be profiled
+    account = get_account()
+    cube_token, cube_farm = deploy()
+    setup_cube_farm()
+    # Give the account some CUBE to stake
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(minter_role, account, {"from": account})
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(account, amount * 2, {"from": account})
+    mint_tx.wait(1)
+    approve_tx = cube_token.approve(cube_farm, amount * 2, {"from": account})
+    approve_tx.wait(1)
+    operations = [
+        ("stakeTokens (new position)", cube_farm.stakeTokens, (amount, cube_token)),
+        (
+            "stakeTokens (existing position)",
+            cube_farm.stakeTokens,
+            (amount, cube_token),
+        ),
+        ("claimYieldRewards", cube_farm.claimYieldRewards, ()),
+        ("unstakeTokens (partial)", cube_farm.unstakeTokens, (amount, cube_token)),
+        ("unstakeTokens (full)", cube_farm.unstakeTokens, (amount, cube_token)),
+    ]
+    transactions = []
+    for name, function, args in operations:
+        # Let some rewards accrue between each operation
+        chain.sleep(RATE)
+        tx = function(*args, {"from": account})
+        tx.wait(1)
+        transactions.append((name, tx))
+    return transactions
+
+
+def print_gas_report(gas_used, baseline=None):
+    width = max(len(name) for name in gas_used)
+    if baseline is None:
+        print(f"{'Operation'.ljust(width)}  Gas used")
+        for name, gas in gas_used.items():
+            print(f"{name.ljust(width)}  {gas}")
+        return
+    print(f"{'Operation'.ljust(width)}    Before     After      Diff")
+    for name, gas in gas_used.items():
+        before = baseline.get(name)
+        if before is None:
+            before, diff = "-", ""
+        else:
+            diff = f"{gas - before:+}"
+        print(
+            f"{name.ljust(width)}  {str(before).rjust(8)}  {str(gas).rjust(8)}"
+            f"  {diff.rjust(8)}"
+        )
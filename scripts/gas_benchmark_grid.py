@@ -0,0 +1,178 @@
+# Gas of the main operations over a grid of allowed tokens and stakers, compared to a committed baseline.
+# The baseline is not generated by main, record it first (and again after an intended gas change)
+# then commit benchmarks/gas_baseline.json:
+#   brownie run scripts/gas_benchmark_grid.py save_baseline
+# Every later run fails if an operation regressed by more than MAX_REGRESSION percent:
+#   brownie run scripts/gas_benchmark_grid.py main [max_regression]
+from brownie import accounts, chain, MockV3Aggregator
+from scripts.helper import get_account, RATE, DECIMALS, INITIAL_PRICE_FEED_VALUE
+from scripts.deploy import deploy, deploy_cube_token
+from web3 import Web3
+import csv
+import json
+import os
+
+AMOUNT = Web3.toWei(1, "ether")
+# Number of allowed tokens (all staked by the benchmarked account) and of other stakers
+TOKEN_COUNTS = [1, 8, 32, 128]
+STAKER_COUNTS = [1, 32, 256, 1024]
+# A run fails if an operation uses more than this percentage of gas over the baseline
+MAX_REGRESSION = 5
+REPORT_FOLDER = "./reports"
+BASELINE_PATH = "./benchmarks/gas_baseline.json"
+
+
+class GasRegressionError(Exception):
+    # Raised with the (row, baseline gas) of every operation over the allowed regression
+    def __init__(self, regressions, max_regression):
+        super().__init__(
+            f"{len(regressions)} operations regressed by more than {max_regression}%:\n"
+            + "\n".join(
+                f"{row['operation']} with {row['tokens']} tokens and {row['stakers']} stakers: "
+                f"{baseline_gas} -> {row['gas_used']}"
+                for row, baseline_gas in regressions
+            )
+        )
+        self.regressions = regressions
+        self.max_regression = max_regression
+
+
+def main(max_regression=MAX_REGRESSION):
+    # Loaded first so a missing baseline fails the run before the grid is benchmarked
+    baseline = load_baseline()
+    rows = benchmark_grid()
+    write_report(rows)
+    regressions = check_regressions(rows, baseline, float(max_regression))
+    if regressions:
+        raise GasRegressionError(regressions, float(max_regression))
+
+
+def save_baseline(baseline_path=BASELINE_PATH):
+    rows = benchmark_grid()
+    write_report(rows)
+    write_baseline(rows, baseline_path)
+    print(f"Baseline of {len(rows)} operations saved to {baseline_path}")
+
+
+def benchmark_grid(token_counts=TOKEN_COUNTS, staker_counts=STAKER_COUNTS):
+    rows = []
+    for token_count in token_counts:
+        # Every token count starts again from a chain without any farm
+        chain.snapshot()
+        cube_token, cube_farm = deploy_farm_with_tokens(token_count)
+        stakers = []
+        for staker_count in sorted(staker_counts):
+            stakers += add_stakers(cube_token, cube_farm, staker_count - len(stakers))
+            gas_used = benchmark_operations(cube_token, cube_farm)
+            rows += [
+                {
+                    "tokens": token_count,
+                    "stakers": staker_count,
+                    "operation": operation,
+                    "gas_used": gas,
+                }
+                for operation, gas in gas_used.items()
+            ]
+        chain.revert()
+    return rows
+
+
+def deploy_farm_with_tokens(token_count):
+    # CubeToken is used for every token since it is the only mintable one, each with its own feed
+    account = get_account()
+    cube_token, cube_farm = deploy()
+    tokens = [cube_token] + [deploy_cube_token() for _ in range(token_count - 1)]
+    for token in tokens:
+        price_feed = MockV3Aggregator.deploy(
+            DECIMALS, INITIAL_PRICE_FEED_VALUE, {"from": account}
+        )
+        cube_farm.addAllowedToken(token, {"from": account}).wait(1)
+        cube_farm.setPriceFeedContract(token, price_feed, {"from": account}).wait(1)
+        token.grantRole(token.MINTER_ROLE(), account, {"from": account}).wait(1)
+        stake(token, cube_farm, account, AMOUNT * 2)
+    cube_token.grantRole(cube_token.MINTER_ROLE(), cube_farm, {"from": account}).wait(1)
+    return cube_token, cube_farm
+
+
+def add_stakers(cube_token, cube_farm, staker_count):
+    account = get_account()
+    stakers = []
+    for _ in range(staker_count):
+        staker = accounts.add()
+        account.transfer(staker, Web3.toWei(1, "ether")).wait(1)
+        stake(cube_token, cube_farm, staker, AMOUNT)
+        stakers.append(staker)
+    return stakers
+
+
+def stake(token, cube_farm, staker, amount):
+    account = get_account()
+    token.mint(staker, amount, {"from": account}).wait(1)
+    token.approve(cube_farm, amount, {"from": staker}).wait(1)
+    cube_farm.stakeTokens(amount, token, {"from": staker}).wait(1)
+
+
+def benchmark_operations(cube_token, cube_farm):
+    account = get_account()
+    cube_token.mint(account, AMOUNT, {"from": account}).wait(1)
+    cube_token.approve(cube_farm, AMOUNT, {"from": account}).wait(1)
+    chain.sleep(RATE)
+    gas_used = {
+        "getTotalPendingRewards": cube_farm.getTotalPendingRewards.estimate_gas(account)
+    }
+    operations = [
+        ("stakeTokens", cube_farm.stakeTokens, (AMOUNT, cube_token)),
+        ("claimYieldRewards", cube_farm.claimYieldRewards, ()),
+        ("unstakeTokens", cube_farm.unstakeTokens, (AMOUNT, cube_token)),
+    ]
+    for name, function, args in operations:
+        tx = function(*args, {"from": account})
+        tx.wait(1)
+        gas_used[name] = tx.gas_used
+    # Leave the farm as it was before measuring, including the mint and approve
+    chain.undo(len(operations) + 2)
+    return gas_used
+
+
+def write_report(rows):
+    os.makedirs(REPORT_FOLDER, exist_ok=True)
+    with open(os.path.join(REPORT_FOLDER, "gas_grid.json"), "w") as report_file:
+        json.dump(rows, report_file, indent=2)
+    with open(
+        os.path.join(REPORT_FOLDER, "gas_grid.csv"), "w", newline=""
+    ) as report_file:
+        writer = csv.DictWriter(
+            report_file, fieldnames=["tokens", "stakers", "operation", "gas_used"]
+        )
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_baseline(rows, baseline_path=BASELINE_PATH):
+    os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+    with open(baseline_path, "w") as baseline_file:
+        json.dump(rows, baseline_file, indent=2)
+
+
+def load_baseline(baseline_path=BASELINE_PATH):
+    if not os.path.exists(baseline_path):
+        raise FileNotFoundError(
+            f"No baseline at {baseline_path}, create it with "
+            "`brownie run scripts/gas_benchmark_grid.py save_baseline`"
+        )
+    with open(baseline_path, "r") as baseline_file:
+        return json.load(baseline_file)
+
+
+def check_regressions(rows, baseline, max_regression=MAX_REGRESSION):
+    # Returns the (row, baseline gas) of every operation over the allowed regression
+    baseline_gas = {
+        (row["tokens"], row["stakers"], row["operation"]): row["gas_used"]
+        for row in baseline
+    }
+    regressions = []
+    for row in rows:
+        gas = baseline_gas.get((row["tokens"], row["stakers"], row["operation"]))
+        if gas is not None and row["gas_used"] > gas * (1 + max_regression / 100):
+            regressions.append((row, gas))
+    return regressions
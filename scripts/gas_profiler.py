@@ -0,0 +1,132 @@
+from scripts.gas_benchmark import run_operations
+from collections import defaultdict
+import os
+
+REPORT_FOLDER = "./reports"
+CALL_OPCODES = ["CALL", "STATICCALL", "DELEGATECALL", "CALLCODE", "CREATE", "CREATE2"]
+
+
+def main():
+    # Needs a node supporting debug_traceTransaction, like the local ganache
+    profiles = [
+        (name, tx.gas_used, profile_trace(tx.trace)) for name, tx in run_operations()
+    ]
+    report = format_profiles(profiles)
+    print(report)
+    write_report(profiles, report)
+
+
+def profile_trace(trace):
+    # Breakdown of the trace expanded by brownie by function, keyed by the call stack of the function.
+    # The gas of a step is attributed to the function running it, the gas of a call opcode excludes
+    # the gas used by the called contract which is attributed to its own functions
+    costs = get_step_costs(trace)
+    stacks = {}
+    profile = defaultdict(
+        lambda: {"gas": 0, "sload": 0, "sstore": 0, "calls": 0, "call_targets": set()}
+    )
+    for index, step in enumerate(trace):
+        depth = step["depth"]
+        # Internal calls of the contract at this depth, the deeper ones have returned
+        stacks[depth] = stacks.get(depth, [])[: step["jumpDepth"]] + [step["fn"]]
+        for deeper in [key for key in stacks if key > depth]:
+            del stacks[deeper]
+        path = tuple(fn for key in sorted(stacks) for fn in stacks[key])
+        row = profile[path]
+        row["gas"] += costs[index]
+        if step["op"] == "SLOAD":
+            row["sload"] += 1
+        elif step["op"] == "SSTORE":
+            row["sstore"] += 1
+        elif step["op"] in CALL_OPCODES:
+            row["calls"] += 1
+            if index + 1 < len(trace) and trace[index + 1]["depth"] > depth:
+                row["call_targets"].add(trace[index + 1]["fn"])
+    return dict(profile)
+
+
+def get_step_costs(trace):
+    # The gas of each step is read from the gas left before the next step of the same contract,
+    # so a call opcode first gets the gas of the whole call, minus what was used inside afterwards
+    costs = []
+    calls = []
+    for index, step in enumerate(trace):
+        end = index + 1
+        while end < len(trace) and trace[end]["depth"] > step["depth"]:
+            end += 1
+        if end < len(trace) and trace[end]["depth"] == step["depth"]:
+            costs.append(step["gas"] - trace[end]["gas"])
+        else:
+            # Last step of a contract, returning to the caller or ending the transaction
+            costs.append(step["gasCost"])
+        if end > index + 1:
+            calls.append((index, end))
+    # Inner calls first so the steps of a call only count what they used themselves
+    for index, end in reversed(calls):
+        costs[index] -= sum(costs[index + 1 : end])
+    return costs
+
+
+def get_function_totals(profile):
+    # Self and inclusive gas by function, a function appearing twice in a stack is only counted once
+    totals = defaultdict(
+        lambda: {
+            "self_gas": 0,
+            "gas": 0,
+            "sload": 0,
+            "sstore": 0,
+            "calls": 0,
+            "call_targets": set(),
+        }
+    )
+    for path, row in profile.items():
+        function = totals[path[-1]]
+        function["self_gas"] += row["gas"]
+        function["sload"] += row["sload"]
+        function["sstore"] += row["sstore"]
+        function["calls"] += row["calls"]
+        function["call_targets"] |= row["call_targets"]
+        for fn in set(path):
+            totals[fn]["gas"] += row["gas"]
+    return dict(totals)
+
+
+def format_profiles(profiles):
+    lines = []
+    for name, gas_used, profile in profiles:
+        totals = get_function_totals(profile)
+        traced_gas = sum(row["gas"] for row in profile.values())
+        # The difference is the intrinsic gas of the transaction minus the refunds
+        lines.append(f"{name}: {gas_used} gas used, {traced_gas} gas traced")
+        width = max(len(fn) for fn in totals)
+        lines.append(
+            f"  {'Function'.ljust(width)}{'Gas'.rjust(10)}{'Self gas'.rjust(10)}"
+            f"{'SLOAD'.rjust(7)}{'SSTORE'.rjust(7)}{'Calls'.rjust(7)}  Called"
+        )
+        for fn, row in sorted(totals.items(), key=lambda total: -total[1]["gas"]):
+            lines.append(
+                f"  {fn.ljust(width)}{str(row['gas']).rjust(10)}"
+                f"{str(row['self_gas']).rjust(10)}{str(row['sload']).rjust(7)}"
+                f"{str(row['sstore']).rjust(7)}{str(row['calls']).rjust(7)}"
+                f"  {', '.join(sorted(row['call_targets']))}".rstrip()
+            )
+        lines.append("")
+    return "\n".join(lines)
+
+
+def format_folded_stacks(profiles):
+    # One line per stack in the folded format of flamegraph.pl and speedscope: frames;separated gas
+    lines = []
+    for name, _, profile in profiles:
+        for path, row in sorted(profile.items()):
+            if row["gas"] > 0:
+                lines.append(f"{';'.join((name,) + path)} {row['gas']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_report(profiles, report):
+    os.makedirs(REPORT_FOLDER, exist_ok=True)
+    with open(os.path.join(REPORT_FOLDER, "gas_profile.txt"), "w") as report_file:
+        report_file.write(report)
+    with open(os.path.join(REPORT_FOLDER, "gas_profile.folded"), "w") as folded_file:
+        folded_file.write(format_folded_stacks(profiles))
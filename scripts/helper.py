@@ -8,6 +8,9 @@ from brownie import (
     MockLINK,
     MockV3Aggregator,
 )
+from eth_keys import keys
+from itertools import repeat
+from web3 import Web3
 
 FORKED_BLOCKCHAIN_ENV = ["mainnet-fork"]
 LOCAL_BLOCKCHAIN_ENV = ["development", "ganache-local"]
@@ -24,6 +27,9 @@ contract_to_mock = {
 INITIAL_PRICE_FEED_VALUE = 2000000000000000000000
 DECIMALS = 18
 RATE = 86400
+PERMIT_TYPEHASH = Web3.keccak(
+    text="Permit(address owner,address spender,uint256 value,uint256 nonce,uint256 deadline)"
+)
 
 
 def get_account(index=None, id=None):
@@ -75,7 +81,48 @@ def deploy_mocks(decimals=DECIMALS, initial_value=INITIAL_PRICE_FEED_VALUE):
 def calculate_rewards_based_on_time(
     amount_to_stake, price, start_time, end_time, decimals=DECIMALS
 ):
-    time_passed = (end_time - start_time) * (10**decimals)
-    time_rate = time_passed / RATE
-    staking_price = (amount_to_stake * price) / (10**decimals)
-    return (staking_price * time_rate) / (10**decimals)
+    return calculate_rewards_batch(
+        [amount_to_stake], price, decimals, [start_time], end_time
+    )[0]
+
+
+def calculate_rewards_batch(
+    amounts, prices, decimals, start_times, end_times, rate=RATE
+):
+    # Same integer math as CubeFarm for positions staked at a constant price:
+    # amount * price * (end_time - start_time) // (rate * 10**decimals)
+    # prices, decimals and end_times can be a single value shared by all the positions
+    prices, decimals, end_times = [
+        repeat(column) if isinstance(column, int) else column
+        for column in (prices, decimals, end_times)
+    ]
+    divisors = {}
+    rewards = []
+    for amount, price, decimal, start_time, end_time in zip(
+        amounts, prices, decimals, start_times, end_times
+    ):
+        divisor = divisors.get(decimal)
+        if divisor is None:
+            divisor = divisors[decimal] = rate * 10 ** int(decimal)
+        rewards.append(
+            int(amount) * int(price) * (int(end_time) - int(start_time)) // divisor
+        )
+    return rewards
+
+
+def get_permit_signature(token, owner, spender, amount, deadline):
+    # owner must be an account with a private key (accounts.add)
+    nonce = token.nonces(owner.address)
+    words = [int(owner.address, 16), int(spender, 16), amount, nonce, deadline]
+    struct_hash = Web3.keccak(
+        PERMIT_TYPEHASH + b"".join(word.to_bytes(32, "big") for word in words)
+    )
+    digest = Web3.keccak(b"\x19\x01" + bytes(token.DOMAIN_SEPARATOR()) + struct_hash)
+    signature = keys.PrivateKey(Web3.toBytes(hexstr=owner.private_key)).sign_msg_hash(
+        digest
+    )
+    return (
+        signature.v + 27,
+        signature.r.to_bytes(32, "big"),
+        signature.s.to_bytes(32, "big"),
+    )
@@ -0,0 +1,297 @@
+from brownie import CubeFarm, network, web3
+from hexbytes import HexBytes
+from web3 import Web3
+import sqlite3
+
+# Number of blocks requested per eth_getLogs call, halved when the node refuses a page
+PAGE_SIZE = 2000
+# Number of past checkpoints kept to find where the chain forked after a reorg,
+# a deeper reorg re-indexes the farm from its deployment block
+CHECKPOINT_HISTORY = 128
+
+EVENT_SIGNATURES = {
+    "TokenStaked": "TokenStaked(address,address,uint256)",
+    "TokenUnstaked": "TokenUnstaked(address,address,uint256)",
+    "YieldRewarded": "YieldRewarded(address,uint256)",
+}
+EVENT_TOPICS = {
+    Web3.keccak(text=signature): name for name, signature in EVENT_SIGNATURES.items()
+}
+
+# uint256 amounts do not fit in a SQLite integer so they are stored as decimal strings
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    farm TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    block_hash TEXT NOT NULL,
+    PRIMARY KEY (farm, block_number)
+);
+CREATE TABLE IF NOT EXISTS events (
+    farm TEXT NOT NULL,
+    block_number INTEGER NOT NULL,
+    log_index INTEGER NOT NULL,
+    block_hash TEXT NOT NULL,
+    tx_hash TEXT NOT NULL,
+    event TEXT NOT NULL,
+    staker TEXT NOT NULL,
+    token TEXT,
+    amount TEXT NOT NULL,
+    PRIMARY KEY (farm, block_number, log_index)
+);
+CREATE TABLE IF NOT EXISTS positions (
+    farm TEXT NOT NULL,
+    staker TEXT NOT NULL,
+    token TEXT NOT NULL,
+    balance TEXT NOT NULL,
+    PRIMARY KEY (farm, staker, token)
+);
+CREATE TABLE IF NOT EXISTS rewards (
+    farm TEXT NOT NULL,
+    staker TEXT NOT NULL,
+    total TEXT NOT NULL,
+    PRIMARY KEY (farm, staker)
+);
+"""
+
+
+def main():
+    cube_farm = CubeFarm[-1]
+    connection = open_index(f"indexer-{network.show_active()}.db")
+    new_events = sync_events(connection, cube_farm)
+    print(
+        f"Indexed {new_events} new events up to block {get_checkpoint(connection, cube_farm)[0]}"
+    )
+
+
+def open_index(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def get_checkpoint(connection, cube_farm):
+    # Returns (block_number, block_hash) of the last indexed block or None
+    return connection.execute(
+        "SELECT block_number, block_hash FROM checkpoints WHERE farm = ? "
+        "ORDER BY block_number DESC LIMIT 1",
+        (cube_farm.address,),
+    ).fetchone()
+
+
+def sync_events(
+    connection, cube_farm, from_block=None, to_block=None, page_size=PAGE_SIZE
+):
+    # Indexes the CubeFarm events up to to_block (latest by default) and returns the number of new events.
+    # The first sync starts from from_block, the deployment block of the farm by default
+    head = web3.eth.block_number
+    if to_block is None or to_block > head:
+        to_block = head
+    if get_checkpoint(connection, cube_farm) is not None:
+        block_number = rollback(
+            connection, cube_farm, find_common_block(connection, cube_farm)
+        )
+        if block_number >= 0:
+            from_block = block_number + 1
+    if from_block is None:
+        from_block = get_deployment_block(cube_farm)
+    new_events = 0
+    while from_block <= to_block:
+        page_end = min(from_block + page_size - 1, to_block)
+        try:
+            logs = get_logs(cube_farm, from_block, page_end)
+        except ValueError:
+            # Most nodes cap the number of logs returned by one call
+            if page_size == 1:
+                raise
+            page_size //= 2
+            continue
+        with connection:
+            for log in logs:
+                apply_event(connection, cube_farm, decode_log(log))
+            set_checkpoint(connection, cube_farm, page_end)
+        new_events += len(logs)
+        from_block = page_end + 1
+    return new_events
+
+
+def get_logs(cube_farm, from_block, to_block):
+    return web3.eth.get_logs(
+        {
+            "address": cube_farm.address,
+            "fromBlock": from_block,
+            "toBlock": to_block,
+            "topics": [[topic.hex() for topic in EVENT_TOPICS]],
+        }
+    )
+
+
+def get_deployment_block(cube_farm):
+    # The deployment receipt is only known for the contracts deployed in this session
+    tx = getattr(cube_farm, "tx", None)
+    if tx is not None:
+        return tx.block_number
+    # Otherwise the first block with the farm code, which needs a node keeping the past states
+    low, high = 0, web3.eth.block_number
+    while low < high:
+        middle = (low + high) // 2
+        if web3.eth.get_code(cube_farm.address, middle):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def get_block_hash(block_number):
+    # None for a block not mined yet, like one that was dropped by a reorg
+    if block_number < 0 or block_number > web3.eth.block_number:
+        return None
+    return web3.eth.get_block(block_number)["hash"].hex()
+
+
+def find_common_block(connection, cube_farm):
+    # Walks back the checkpoints until one is still on the chain and returns its block
+    # number, -1 when the chain forked before the oldest checkpoint kept
+    rows = connection.execute(
+        "SELECT block_number, block_hash FROM checkpoints WHERE farm = ? "
+        "ORDER BY block_number DESC",
+        (cube_farm.address,),
+    ).fetchall()
+    for block_number, block_hash in rows:
+        if get_block_hash(block_number) == block_hash:
+            return block_number
+    return -1
+
+
+def set_checkpoint(connection, cube_farm, block_number):
+    connection.execute(
+        "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?)",
+        (cube_farm.address, block_number, get_block_hash(block_number)),
+    )
+    connection.execute(
+        "DELETE FROM checkpoints WHERE farm = ? AND block_number NOT IN ("
+        "SELECT block_number FROM checkpoints WHERE farm = ? "
+        "ORDER BY block_number DESC LIMIT ?)",
+        (cube_farm.address, cube_farm.address, CHECKPOINT_HISTORY),
+    )
+
+
+def decode_log(log):
+    topics = [HexBytes(topic) for topic in log["topics"]]
+    data = HexBytes(log["data"])
+    event = EVENT_TOPICS[topics[0]]
+    staker = Web3.toChecksumAddress(topics[2 if event != "YieldRewarded" else 1][-20:])
+    token = None
+    if event != "YieldRewarded":
+        token = Web3.toChecksumAddress(topics[1][-20:])
+    return {
+        "block_number": log["blockNumber"],
+        "log_index": log["logIndex"],
+        "block_hash": HexBytes(log["blockHash"]).hex(),
+        "tx_hash": HexBytes(log["transactionHash"]).hex(),
+        "event": event,
+        "staker": staker,
+        "token": token,
+        "amount": int.from_bytes(data[:32], "big"),
+    }
+
+
+def apply_event(connection, cube_farm, event, sign=1):
+    # sign is -1 when the event is rolled back
+    if sign == 1:
+        connection.execute(
+            "INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                cube_farm.address,
+                event["block_number"],
+                event["log_index"],
+                event["block_hash"],
+                event["tx_hash"],
+                event["event"],
+                event["staker"],
+                event["token"],
+                str(event["amount"]),
+            ),
+        )
+    if event["event"] == "YieldRewarded":
+        total = get_total_rewarded(connection, cube_farm, event["staker"])
+        connection.execute(
+            "INSERT OR REPLACE INTO rewards VALUES (?, ?, ?)",
+            (
+                cube_farm.address,
+                event["staker"],
+                str(total + sign * event["amount"]),
+            ),
+        )
+        return
+    if event["event"] == "TokenUnstaked":
+        sign = -sign
+    balance = get_position(connection, cube_farm, event["staker"], event["token"])
+    balance += sign * event["amount"]
+    if balance == 0:
+        connection.execute(
+            "DELETE FROM positions WHERE farm = ? AND staker = ? AND token = ?",
+            (cube_farm.address, event["staker"], event["token"]),
+        )
+    else:
+        connection.execute(
+            "INSERT OR REPLACE INTO positions VALUES (?, ?, ?, ?)",
+            (cube_farm.address, event["staker"], event["token"], str(balance)),
+        )
+
+
+def rollback(connection, cube_farm, block_number):
+    # Reverts every event after block_number, -1 to revert them all, and returns the new checkpoint.
+    # The checkpoints after it are dropped, the ones before keep the hashes they were indexed with
+    block_number = max(block_number, -1)
+    rows = connection.execute(
+        "SELECT block_number, log_index, event, staker, token, amount FROM events "
+        "WHERE farm = ? AND block_number > ? ORDER BY block_number DESC, log_index DESC",
+        (cube_farm.address, block_number),
+    ).fetchall()
+    with connection:
+        for row in rows:
+            event = dict(
+                zip(("block_number", "log_index", "event", "staker", "token"), row)
+            )
+            event["amount"] = int(row[5])
+            apply_event(connection, cube_farm, event, sign=-1)
+        connection.execute(
+            "DELETE FROM events WHERE farm = ? AND block_number > ?",
+            (cube_farm.address, block_number),
+        )
+        connection.execute(
+            "DELETE FROM checkpoints WHERE farm = ? AND block_number > ?",
+            (cube_farm.address, block_number),
+        )
+    return block_number
+
+
+def get_position(connection, cube_farm, staker, token):
+    row = connection.execute(
+        "SELECT balance FROM positions WHERE farm = ? AND staker = ? AND token = ?",
+        (cube_farm.address, staker, token),
+    ).fetchone()
+    return int(row[0]) if row else 0
+
+
+def get_positions(connection, cube_farm, staker):
+    rows = connection.execute(
+        "SELECT token, balance FROM positions WHERE farm = ? AND staker = ?",
+        (cube_farm.address, staker),
+    ).fetchall()
+    return {token: int(balance) for token, balance in rows}
+
+
+def get_stakers(connection, cube_farm):
+    rows = connection.execute(
+        "SELECT DISTINCT staker FROM positions WHERE farm = ?", (cube_farm.address,)
+    ).fetchall()
+    return [staker for (staker,) in rows]
+
+
+def get_total_rewarded(connection, cube_farm, staker):
+    row = connection.execute(
+        "SELECT total FROM rewards WHERE farm = ? AND staker = ?",
+        (cube_farm.address, staker),
+    ).fetchone()
+    return int(row[0]) if row else 0
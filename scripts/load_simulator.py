@@ -0,0 +1,119 @@
+from brownie import accounts, chain, exceptions, MockV3Aggregator
+from scripts.helper import get_account, get_contract, deploy_mocks, RATE
+from scripts.deploy import deploy, setup_cube_farm
+from collections import Counter, defaultdict
+from web3 import Web3
+import random
+import time
+
+ACCOUNT_COUNT = 200
+STEPS = 2000
+SEED = 0
+# Relative weights of the operations picked at each step
+OPERATION_WEIGHTS = {"stake": 5, "unstake": 3, "claim": 2}
+MAX_AMOUNT = Web3.toWei(10, "ether")
+INITIAL_BALANCE = Web3.toWei(100, "ether")
+# Time advanced between two steps is picked between 0 and MAX_SLEEP seconds
+MAX_SLEEP = RATE // 24
+PERCENTILES = [50, 90, 99]
+
+
+def main(account_count=ACCOUNT_COUNT, steps=STEPS, seed=SEED):
+    results = simulate(int(account_count), int(steps), int(seed))
+    print_load_report(results)
+
+
+def simulate(account_count=ACCOUNT_COUNT, steps=STEPS, seed=SEED):
+    rng = random.Random(seed)
+    if len(MockV3Aggregator) <= 0:
+        deploy_mocks()
+    cube_token, cube_farm = deploy()
+    setup_cube_farm(cube_token, cube_farm)
+    tokens = [
+        get_contract("weth_token"),
+        get_contract("fau_token"),
+        get_contract("link_token"),
+    ]
+    users = get_users(account_count)
+    fund_users(users, tokens, cube_farm)
+    gas_used = defaultdict(list)
+    failures = Counter()
+    operations = list(OPERATION_WEIGHTS)
+    weights = list(OPERATION_WEIGHTS.values())
+    start = time.time()
+    for _ in range(steps):
+        user = rng.choice(users)
+        operation = rng.choices(operations, weights)[0]
+        token = rng.choice(tokens)
+        amount = rng.randint(1, MAX_AMOUNT)
+        if operation == "stake":
+            function, args = cube_farm.stakeTokens, (amount, token)
+        elif operation == "unstake":
+            function, args = cube_farm.unstakeTokens, (amount, token)
+        else:
+            function, args = cube_farm.claimYieldRewards, ()
+        try:
+            tx = function(*args, {"from": user})
+            tx.wait(1)
+            gas_used[operation].append(tx.gas_used)
+        except exceptions.VirtualMachineError as error:
+            failures[(operation, error.revert_msg)] += 1
+        chain.sleep(rng.randint(0, MAX_SLEEP))
+    elapsed = time.time() - start
+    return {
+        "steps": steps,
+        "elapsed": elapsed,
+        "transactions_per_second": steps / elapsed,
+        "gas_used": dict(gas_used),
+        "failures": dict(failures),
+    }
+
+
+def get_users(account_count):
+    # Use the accounts of the local node first, then local accounts funded by the main account
+    account = get_account()
+    users = [get_account(index=index) for index in range(1, len(accounts))]
+    users = users[:account_count]
+    while len(users) < account_count:
+        user = accounts.add()
+        account.transfer(user, Web3.toWei(1, "ether")).wait(1)
+        users.append(user)
+    return users
+
+
+def fund_users(users, tokens, cube_farm):
+    account = get_account()
+    for user in users:
+        for token in tokens:
+            token.mint(user, INITIAL_BALANCE, {"from": account}).wait(1)
+            token.approve(cube_farm, INITIAL_BALANCE, {"from": user}).wait(1)
+
+
+def get_percentile(values, percentile):
+    # Nearest rank percentile
+    values = sorted(values)
+    rank = max(1, -(-percentile * len(values) // 100))
+    return values[rank - 1]
+
+
+def print_load_report(results):
+    print(
+        f"{results['steps']} transactions in {results['elapsed']:.1f}s "
+        f"({results['transactions_per_second']:.1f} tx/s)"
+    )
+    header = "".join(f"  p{percentile}".rjust(10) for percentile in PERCENTILES)
+    print(f"{'Operation'.ljust(10)}{'Count'.rjust(8)}{header}{'Max'.rjust(10)}")
+    for operation, gas_used in results["gas_used"].items():
+        percentiles = "".join(
+            str(get_percentile(gas_used, percentile)).rjust(10)
+            for percentile in PERCENTILES
+        )
+        print(
+            f"{operation.ljust(10)}{str(len(gas_used)).rjust(8)}{percentiles}"
+            f"{str(max(gas_used)).rjust(10)}"
+        )
+    print("Failed transactions")
+    for (operation, revert_msg), count in sorted(
+        results["failures"].items(), key=lambda failure: -failure[1]
+    ):
+        print(f"  {operation}: {revert_msg} ({count})")
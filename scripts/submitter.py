@@ -0,0 +1,150 @@
+from brownie import chain, web3
+from brownie.network.transaction import Status
+from eth_utils import keccak, to_bytes, to_checksum_address
+from web3.exceptions import TransactionNotFound
+import rlp
+import time
+
+# Seconds a transaction can stay pending before it is replaced with a higher gas price
+REPLACE_AFTER = 120
+# Minimum gas price bump accepted by the nodes for a replacement transaction
+GAS_PRICE_INCREMENT = 1.125
+MAX_RETRIES = 3
+POLL_INTERVAL = 1
+# Errors of a node which already has the transaction, sent by an attempt that failed on our side
+ALREADY_KNOWN_ERRORS = ["already known", "known transaction"]
+
+
+class Submitter:
+    # Sends transactions back-to-back with locally managed nonces and waits for all the receipts at once.
+    # Transactions from the same account are executed in nonce order, but brownie estimates the gas of each
+    # one against the last mined state, where the pending transactions have not run yet. A transaction
+    # depending on a pending one (a role granted, a token minted...) would revert or run out of gas there,
+    # so it must be given a gas_limit, which skips the estimation, or be sent after wait_all.
+    def __init__(self, account):
+        self.account = account
+        self.nonce = web3.eth.get_transaction_count(account.address, "pending")
+        self.reset()
+
+    def reset(self):
+        # transactions holds the last transaction sent for each nonce, None until it is found when the
+        # node already had it, and sent every transaction sent for this nonce including the replaced ones
+        self.transactions = []
+        self.sent = []
+        self.nonces = []
+        self.sent_at = []
+        self.sent_from_block = []
+
+    def send(self, function, *args, gas_limit=None, tx_params=None):
+        # function is a contract function or a ContractContainer.deploy.
+        # Returns None when the transaction reached the node without a receipt, wait_all finds it by nonce
+        params = {"from": self.account, "nonce": self.nonce, "required_confs": 0}
+        if gas_limit is not None:
+            params["gas_limit"] = gas_limit
+        params.update(tx_params or {})
+        from_block = web3.eth.block_number
+        for attempt in range(MAX_RETRIES):
+            try:
+                tx = function(*args, params)
+                break
+            except ValueError as error:
+                if is_already_sent(error, attempt):
+                    tx = None
+                    break
+                # The node refused the transaction (busy, underpriced...), try again with the same nonce
+                if attempt == MAX_RETRIES - 1:
+                    raise
+                time.sleep(POLL_INTERVAL)
+        self.transactions.append(tx)
+        self.sent.append([] if tx is None else [tx])
+        self.nonces.append(self.nonce)
+        self.sent_at.append(time.time())
+        self.sent_from_block.append(from_block)
+        self.nonce += 1
+        return tx
+
+    def deploy(self, contract_container, *args, gas_limit=None, tx_params=None):
+        # Returns the address of the contract before it is mined so it can be used by the next transactions.
+        # Only its address, the constructor of the next contract must not call it before it is mined
+        address = get_deploy_address(self.account.address, self.nonce)
+        self.send(
+            contract_container.deploy, *args, gas_limit=gas_limit, tx_params=tx_params
+        )
+        return address
+
+    def wait_all(self, replace_after=REPLACE_AFTER):
+        # Every transaction is already in the mempool, so they are mined together and this only polls them
+        pending = set(range(len(self.transactions)))
+        while pending:
+            for index in sorted(pending):
+                tx = self.transactions[index]
+                if tx is None:
+                    tx = self.find_by_nonce(index)
+                    if tx is None:
+                        continue
+                    self.transactions[index] = tx
+                if tx.status == Status.Pending:
+                    if time.time() - self.sent_at[index] > replace_after:
+                        tx = tx.replace(GAS_PRICE_INCREMENT)
+                        self.transactions[index] = tx
+                        self.sent[index].append(tx)
+                        self.sent_at[index] = time.time()
+                    continue
+                if tx.status == Status.Dropped:
+                    # The replaced transaction may be the one mined, which drops its replacement
+                    mined = self.find_mined(index)
+                    if mined is None:
+                        raise RuntimeError(f"Transaction {tx.txid} was dropped")
+                    self.transactions[index] = mined
+                pending.remove(index)
+            if pending:
+                time.sleep(POLL_INTERVAL)
+        reverted = [tx for tx in self.transactions if tx.status == Status.Reverted]
+        if reverted:
+            raise RuntimeError(
+                f"{len(reverted)} transactions reverted, first one: {reverted[0].txid}"
+            )
+        transactions = self.transactions
+        self.reset()
+        return transactions
+
+    def find_mined(self, index):
+        # Receipt of whichever transaction sent with this nonce was mined, None if none of them was
+        for tx in self.sent[index]:
+            try:
+                web3.eth.get_transaction_receipt(tx.txid)
+            except TransactionNotFound:
+                continue
+            return chain.get_transaction(tx.txid)
+        return None
+
+    def find_by_nonce(self, index):
+        # Receipt of a transaction the node had before send got it, None while its nonce is not mined
+        nonce = self.nonces[index]
+        if web3.eth.get_transaction_count(self.account.address) <= nonce:
+            return None
+        for block_number in range(
+            self.sent_from_block[index], web3.eth.block_number + 1
+        ):
+            block = web3.eth.get_block(block_number, full_transactions=True)
+            for tx in block["transactions"]:
+                if tx["from"] == self.account.address and tx["nonce"] == nonce:
+                    return chain.get_transaction(tx["hash"].hex())
+        raise RuntimeError(
+            f"Nonce {nonce} was used by a transaction not sent by Submitter"
+        )
+
+
+def is_already_sent(error, attempt):
+    # A nonce too low is only ours on a retry, the first attempt would have used a nonce already mined
+    message = str(error).lower()
+    if any(known_error in message for known_error in ALREADY_KNOWN_ERRORS):
+        return True
+    return attempt > 0 and "nonce too low" in message
+
+
+def get_deploy_address(sender, nonce):
+    # Address of a contract created with CREATE: keccak(rlp([sender, nonce]))[12:]
+    return to_checksum_address(
+        keccak(rlp.encode([to_bytes(hexstr=sender), nonce]))[12:]
+    )
@@ -1,24 +1,105 @@
 from brownie import config
+from web3 import Web3
+import hashlib
 import os
 import shutil
 import yaml
 import json
 
+BUILD_FOLDER = "./build"
+# Hashes of the files copied by the last run, used to only copy what changed
+MANIFEST_FILE = ".manifest.json"
+BUNDLE_FILE = "contracts.json"
 
-def main():
-    update_frontend()
 
+def main(mode="full"):
+    # brownie run scripts/update_frontend.py main minimal
+    update_frontend(minimal=mode == "minimal")
 
-def update_frontend():
-    src = "./build"
+
+def update_frontend(minimal=False):
     dest = config["front_end_path"] + "/chain-info"
-    if os.path.exists(dest):
-        shutil.rmtree(dest)
-    shutil.copytree(src, dest)
+    if minimal:
+        os.makedirs(dest, exist_ok=True)
+        write_if_changed(
+            os.path.join(dest, BUNDLE_FILE),
+            json.dumps(get_frontend_bundle(), separators=(",", ":"), sort_keys=True),
+        )
+    else:
+        sync_folder(BUILD_FOLDER, dest)
 
     with open("brownie-config.yaml", "r") as brownie_config:
         config_dict = yaml.load(brownie_config, Loader=yaml.FullLoader)
-        with open(
-            config["front_end_path"] + "/brownie-config.json", "w"
-        ) as brownie_config_json:
-            json.dump(config_dict, brownie_config_json)
+    write_if_changed(
+        config["front_end_path"] + "/brownie-config.json", json.dumps(config_dict)
+    )
+
+
+def sync_folder(src, dest):
+    # Copies the files of src whose content changed since the last sync and removes the deleted ones
+    manifest_path = os.path.join(dest, MANIFEST_FILE)
+    old_manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r") as manifest_file:
+            old_manifest = json.load(manifest_file)
+    manifest = {}
+    for root, _, files in os.walk(src):
+        for file in files:
+            path = os.path.relpath(os.path.join(root, file), src)
+            manifest[path] = get_file_hash(os.path.join(src, path))
+            dest_path = os.path.join(dest, path)
+            if old_manifest.get(path) != manifest[path] or not os.path.exists(
+                dest_path
+            ):
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                shutil.copy2(os.path.join(src, path), dest_path)
+    for path in old_manifest.keys() - manifest.keys():
+        if os.path.exists(os.path.join(dest, path)):
+            os.remove(os.path.join(dest, path))
+    os.makedirs(dest, exist_ok=True)
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(manifest, manifest_file, sort_keys=True)
+    return manifest
+
+
+def get_frontend_bundle():
+    # Only what the frontend reads: ABI, deployed address by chain id and a hash of the bytecode
+    deployments = {}
+    map_path = os.path.join(BUILD_FOLDER, "deployments", "map.json")
+    if os.path.exists(map_path):
+        with open(map_path, "r") as map_file:
+            deployments = json.load(map_file)
+    bundle = {}
+    contracts_folder = os.path.join(BUILD_FOLDER, "contracts")
+    for file in sorted(os.listdir(contracts_folder)):
+        if not file.endswith(".json"):
+            continue
+        with open(os.path.join(contracts_folder, file), "r") as artifact_file:
+            artifact = json.load(artifact_file)
+        name = artifact["contractName"]
+        bundle[name] = {
+            "abi": artifact["abi"],
+            "bytecodeHash": Web3.keccak(hexstr=artifact["bytecode"] or "0x").hex(),
+            # brownie keeps the most recent deployment first
+            "addresses": {
+                chain_id: addresses[name][0]
+                for chain_id, addresses in deployments.items()
+                if addresses.get(name)
+            },
+        }
+    return bundle
+
+
+def write_if_changed(path, content):
+    if os.path.exists(path):
+        with open(path, "r") as current_file:
+            if current_file.read() == content:
+                return False
+    with open(path, "w") as new_file:
+        new_file.write(content)
+    return True
+
+
+def get_file_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
@@ -1,3 +1,6 @@
+from brownie import network, chain
+from scripts.helper import LOCAL_BLOCKCHAIN_ENV, get_contract
+from scripts.deploy import deploy, deploy_cube_token, setup_cube_farm
 import pytest
 from web3 import Web3
 
@@ -5,3 +8,41 @@ from web3 import Web3
 @pytest.fixture
 def amount_to_stake():
     return Web3.toWei(1, "ether")
+
+
+@pytest.fixture(autouse=True)
+def isolation():
+    # Each local test runs on a snapshot of the chain which is reverted afterwards, so the tests
+    # of a module share the contracts deployed below without seeing each other's transactions
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        yield
+        return
+    chain.snapshot()
+    yield
+    chain.revert()
+
+
+@pytest.fixture(scope="module")
+def cube_token():
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    return deploy_cube_token()
+
+
+@pytest.fixture(scope="module")
+def cube_contracts():
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    # Deploy the mocks outside of the tests too, or they would be reverted and redeployed by each test
+    get_contract("eth_usd_price_feed")
+    return deploy()
+
+
+@pytest.fixture(scope="module")
+def configured_cube_contracts():
+    # Farm with the mock tokens allowed, their price feeds set and the minter role granted
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    cube_token, cube_farm = deploy()
+    setup_cube_farm(cube_token, cube_farm)
+    return cube_token, cube_farm
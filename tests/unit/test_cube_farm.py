@@ -1,4 +1,4 @@
-from brownie import network, exceptions, chain, reverts
+from brownie import network, exceptions, chain, reverts, accounts, MockV3Aggregator
 from scripts.helper import (
     LOCAL_BLOCKCHAIN_ENV,
     RATE,
@@ -7,8 +7,11 @@ from scripts.helper import (
     get_account,
     get_contract,
     calculate_rewards_based_on_time,
+    calculate_rewards_batch,
+    get_permit_signature,
 )
-from scripts.deploy import deploy
+from scripts.deploy import deploy_cube_token
+from scripts.cube_farm_model import CubeFarmModel
 from web3 import Web3
 import pytest
 import math
@@ -17,22 +20,22 @@ import math
 REL_TOL = 1e-6
 
 
-def test_constructor_set_up_correctly():
+def test_constructor_set_up_correctly(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     assert cube_farm.getRate() == RATE
     assert cube_token.address == cube_farm.getCubeTokenAddress()
 
 
-def test_cannot_set_price_feed_if_non_owner():
+def test_cannot_set_price_feed_if_non_owner(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     non_owner = get_account(index=1)
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     with reverts("Only owner can set price feed"):
         cube_farm.setPriceFeedContract(
@@ -42,12 +45,12 @@ def test_cannot_set_price_feed_if_non_owner():
         )
 
 
-def test_can_set_price_feed_if_owner():
+def test_can_set_price_feed_if_owner(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act
     set_price_feed_tx = cube_farm.setPriceFeedContract(
         cube_token.address,
@@ -61,23 +64,23 @@ def test_can_set_price_feed_if_owner():
     )
 
 
-def test_cannot_add_allowed_token_if_non_owner():
+def test_cannot_add_allowed_token_if_non_owner(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     non_owner = get_account(index=1)
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     with reverts("Only owner can add token"):
         cube_farm.addAllowedToken(get_contract("weth_token"), {"from": non_owner})
 
 
-def test_can_add_allowed_token_if_owner():
+def test_can_add_allowed_token_if_owner(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act
     add_allowed_token_tx = cube_farm.addAllowedToken(
         get_contract("weth_token"), {"from": account}
@@ -87,34 +90,114 @@ def test_can_add_allowed_token_if_owner():
     assert get_contract("weth_token") in cube_farm.getAllowedTokens()
 
 
-def test_cannot_stake_token_if_amount_zero():
+def test_cannot_add_allowed_token_twice(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        get_contract("weth_token"), {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    # Act / Assert
+    with reverts("Token already allowed"):
+        cube_farm.addAllowedToken(get_contract("weth_token"), {"from": account})
+
+
+def test_cannot_remove_allowed_token_if_non_owner(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    non_owner = get_account(index=1)
+    cube_token, cube_farm = cube_contracts
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        get_contract("weth_token"), {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    # Act / Assert
+    with reverts("Only owner can remove token"):
+        cube_farm.removeAllowedToken(get_contract("weth_token"), {"from": non_owner})
+
+
+def test_cannot_remove_token_if_not_allowed(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Act / Assert
+    with reverts("Token not allowed"):
+        cube_farm.removeAllowedToken(get_contract("weth_token"), {"from": account})
+
+
+def test_can_remove_allowed_token_if_owner(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    for token in [
+        get_contract("weth_token"),
+        get_contract("fau_token"),
+        get_contract("link_token"),
+    ]:
+        add_allowed_token_tx = cube_farm.addAllowedToken(token, {"from": account})
+        add_allowed_token_tx.wait(1)
+    # Act
+    remove_allowed_token_tx = cube_farm.removeAllowedToken(
+        get_contract("weth_token"), {"from": account}
+    )
+    remove_allowed_token_tx.wait(1)
+    # Assert
+    assert cube_farm.getAllowedTokens() == [
+        get_contract("link_token"),
+        get_contract("fau_token"),
+    ]
+    # The moved token can still be removed and the removed one added again
+    remove_allowed_token_tx = cube_farm.removeAllowedToken(
+        get_contract("link_token"), {"from": account}
+    )
+    remove_allowed_token_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        get_contract("weth_token"), {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    assert cube_farm.getAllowedTokens() == [
+        get_contract("fau_token"),
+        get_contract("weth_token"),
+    ]
+
+
+def test_cannot_stake_token_if_amount_zero(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     with reverts("Cannot stake amount 0"):
         cube_farm.stakeTokens(0, cube_token.address, {"from": account})
 
 
-def test_cannot_stake_token_if_user_balance_not_enough(amount_to_stake):
+def test_cannot_stake_token_if_user_balance_not_enough(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     with reverts("Not enough balance"):
         cube_farm.stakeTokens(amount_to_stake, cube_token.address, {"from": account})
 
 
-def test_cannot_stake_token_if_token_not_allowed(amount_to_stake):
+def test_cannot_stake_token_if_token_not_allowed(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -128,12 +211,12 @@ def test_cannot_stake_token_if_token_not_allowed(amount_to_stake):
         cube_farm.stakeTokens(amount_to_stake, cube_token.address, {"from": account})
 
 
-def test_can_stake_token(amount_to_stake):
+def test_can_stake_token(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -168,27 +251,30 @@ def test_can_stake_token(amount_to_stake):
         == amount_to_stake
     )
     assert cube_farm.getNumberOfTokenStaked(account.address) == 1
+    assert cube_farm.getUserStakedTokens(account.address) == [cube_token.address]
     assert account.address in cube_farm.getStakers()
     assert len(stake_token_tx.events["TokenStaked"]) == 1
 
 
-def test_cannot_unstake_token_if_user_balance_zero(amount_to_stake):
+def test_cannot_unstake_token_if_user_balance_zero(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     with reverts("Cannot unstake 0 blance"):
         cube_farm.unstakeTokens(amount_to_stake, cube_token.address, {"from": account})
 
 
-def test_cannot_unstake_token_if_amount_greater_than_user_balance(amount_to_stake):
+def test_cannot_unstake_token_if_amount_greater_than_user_balance(
+    cube_contracts, amount_to_stake
+):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -216,12 +302,12 @@ def test_cannot_unstake_token_if_amount_greater_than_user_balance(amount_to_stak
         )
 
 
-def test_can_unstake_token(amount_to_stake):
+def test_can_unstake_token(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -257,26 +343,27 @@ def test_can_unstake_token(amount_to_stake):
     assert cube_token.balanceOf(account) == amount_to_stake
     assert cube_farm.getUserTokenBalance(account.address, cube_token.address) == 0
     assert cube_farm.getNumberOfTokenStaked(account.address) == 0
+    assert cube_farm.getUserStakedTokens(account.address) == []
     assert account.address not in cube_farm.getStakers()
     assert len(unstake_token_tx.events["TokenUnstaked"]) == 1
 
 
-def test_can_get_total_pending_rewards_when_zero_token_staked():
+def test_can_get_total_pending_rewards_when_zero_token_staked(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     assert cube_farm.getTotalPendingRewards(account.address) == 0
 
 
-def test_can_get_total_pending_rewards(amount_to_stake):
+def test_can_get_total_pending_rewards(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -320,23 +407,23 @@ def test_can_get_total_pending_rewards(amount_to_stake):
     assert total_pending_rewards >= expected_pending_rewards
 
 
-def test_cannot_claim_yield_rewards_if_no_rewards():
+def test_cannot_claim_yield_rewards_if_no_rewards(cube_contracts):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Act / Assert
     with reverts("No rewards to transfer"):
         cube_farm.claimYieldRewards({"from": account})
 
 
-def test_can_claim_yield_rewards(amount_to_stake):
+def test_can_claim_yield_rewards(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -379,21 +466,21 @@ def test_can_claim_yield_rewards(amount_to_stake):
         INITIAL_PRICE_FEED_VALUE,
         start_time_when_staked,
         start_time_when_claimed,
-    ) / (10**DECIMALS)
-    cube_balance = cube_token.balanceOf(account) / (10**DECIMALS)
+    )
+    cube_balance = cube_token.balanceOf(account)
     # Assert
-    # Removing the decimals and asserting with isclose because python and solidity round and can be a bit different
+    # Python computes the rewards with the same integer math as the contract
     assert cube_balance > 0
-    assert math.isclose(cube_balance, expected_rewards, rel_tol=REL_TOL)
+    assert cube_balance == expected_rewards
     assert len(claim_yield_rewards_tx.events["YieldRewarded"]) == 1
 
 
-def test_can_claim_yield_rewards_after_unstake(amount_to_stake):
+def test_can_claim_yield_rewards_after_unstake(cube_contracts, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -429,9 +516,7 @@ def test_can_claim_yield_rewards_after_unstake(amount_to_stake):
         amount_to_stake, cube_token.address, {"from": account}
     )
     unstake_token_tx.wait(1)
-    cube_balance_after_unstaking = cube_farm.getUserCubeBalance(account.address) / (
-        10**DECIMALS
-    )
+    cube_balance_after_unstaking = cube_farm.getUserCubeBalance(account.address)
     start_time_when_unstaked = cube_farm.getUserTokenStartTime(
         account.address, cube_token.address
     )
@@ -443,23 +528,25 @@ def test_can_claim_yield_rewards_after_unstake(amount_to_stake):
         INITIAL_PRICE_FEED_VALUE,
         start_time_when_staked,
         start_time_when_unstaked,
-    ) / (10**DECIMALS)
-    expected_total_value = (amount_to_stake / (10**DECIMALS)) + expected_rewards
-    cube_balance = cube_token.balanceOf(account) / (10**DECIMALS)
+    )
+    expected_total_value = amount_to_stake + expected_rewards
+    cube_balance = cube_token.balanceOf(account)
     # Assert
-    # Removing the decimals and asserting with isclose because python and solidity round and can be a bit different
-    assert math.isclose(cube_balance_after_unstaking, expected_rewards, rel_tol=REL_TOL)
+    # Python computes the rewards with the same integer math as the contract
+    assert cube_balance_after_unstaking == expected_rewards
     assert cube_balance > 0
-    assert math.isclose(cube_balance, expected_total_value, rel_tol=REL_TOL)
+    assert cube_balance == expected_total_value
     assert len(claim_yield_rewards_tx.events["YieldRewarded"]) == 1
 
 
-def test_can_claim_yield_rewards_after_staking_two_times(amount_to_stake):
+def test_can_claim_yield_rewards_after_staking_two_times(
+    cube_contracts, amount_to_stake
+):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -501,9 +588,7 @@ def test_can_claim_yield_rewards_after_staking_two_times(amount_to_stake):
         amount_to_stake, cube_token.address, {"from": account}
     )
     stake_token_tx.wait(1)
-    cube_balance_after_second_staking = cube_farm.getUserCubeBalance(
-        account.address
-    ) / (10**DECIMALS)
+    cube_balance_after_second_staking = cube_farm.getUserCubeBalance(account.address)
     start_time_when_second_staking = cube_farm.getUserTokenStartTime(
         account.address, cube_token.address
     )
@@ -520,37 +605,34 @@ def test_can_claim_yield_rewards_after_staking_two_times(amount_to_stake):
     # 2000 is added the second day -> total 4000 staked
     # After another 1 day the rewards should be the first 2000 + 4000 (of the second day)
     # expected rewards should then be 2000 + 4000
-    expected_rewards_first_staking = calculate_rewards_based_on_time(
-        amount_to_stake,
-        INITIAL_PRICE_FEED_VALUE,
-        start_time_when_first_staking,
-        start_time_when_second_staking,
-    ) / (10**DECIMALS)
-    expected_rewards_second_staking = calculate_rewards_based_on_time(
-        # Now there is 2 times the amount staked
-        amount_to_stake * 2,
-        INITIAL_PRICE_FEED_VALUE,
-        start_time_when_second_staking,
-        start_time_when_claimed,
-    ) / (10**DECIMALS)
+    expected_rewards_first_staking, expected_rewards_second_staking = (
+        calculate_rewards_batch(
+            # Now there is 2 times the amount staked
+            [amount_to_stake, amount_to_stake * 2],
+            INITIAL_PRICE_FEED_VALUE,
+            DECIMALS,
+            [start_time_when_first_staking, start_time_when_second_staking],
+            [start_time_when_second_staking, start_time_when_claimed],
+        )
+    )
     expected_rewards = expected_rewards_first_staking + expected_rewards_second_staking
-    cube_balance = cube_token.balanceOf(account) / (10**DECIMALS)
+    cube_balance = cube_token.balanceOf(account)
     # Assert
-    # Removing the decimals and asserting with isclose because python and solidity round and can be a bit different
-    assert math.isclose(
-        cube_balance_after_second_staking, expected_rewards_first_staking
-    )
+    # Python computes the rewards with the same integer math as the contract
+    assert cube_balance_after_second_staking == expected_rewards_first_staking
     assert cube_balance > 0
-    assert math.isclose(cube_balance, expected_rewards, rel_tol=REL_TOL)
+    assert cube_balance == expected_rewards
     assert len(claim_yield_rewards_tx.events["YieldRewarded"]) == 1
 
 
-def test_can_claim_rewards_after_staking_unstaking_and_staking(amount_to_stake):
+def test_can_claim_rewards_after_staking_unstaking_and_staking(
+    cube_contracts, amount_to_stake
+):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token, cube_farm = deploy()
+    cube_token, cube_farm = cube_contracts
     # Transfer the role to CubeFarm
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -586,9 +668,7 @@ def test_can_claim_rewards_after_staking_unstaking_and_staking(amount_to_stake):
         amount_to_stake, cube_token.address, {"from": account}
     )
     unstake_token_tx.wait(1)
-    cube_balance_after_unstaking = cube_farm.getUserCubeBalance(account.address) / (
-        10**DECIMALS
-    )
+    cube_balance_after_unstaking = cube_farm.getUserCubeBalance(account.address)
     start_time_when_unstaked = cube_farm.getUserTokenStartTime(
         account.address, cube_token.address
     )
@@ -619,25 +699,876 @@ def test_can_claim_rewards_after_staking_unstaking_and_staking(amount_to_stake):
     # 2000 is staked the third day
     # After another 1 day the rewards should be the first 2000 + 2000 (from the third day)
     # expected rewards should then be 2000 + 2000
-    expected_rewards_first_staking = calculate_rewards_based_on_time(
-        amount_to_stake,
-        INITIAL_PRICE_FEED_VALUE,
-        start_time_when_first_staking,
-        start_time_when_unstaked,
-    ) / (10**DECIMALS)
-    expected_rewards_second_staking = calculate_rewards_based_on_time(
+    expected_rewards_first_staking, expected_rewards_second_staking = (
+        calculate_rewards_batch(
+            [amount_to_stake, amount_to_stake],
+            INITIAL_PRICE_FEED_VALUE,
+            DECIMALS,
+            [start_time_when_first_staking, start_time_when_second_staking],
+            [start_time_when_unstaked, start_time_when_claimed],
+        )
+    )
+    expected_rewards = expected_rewards_first_staking + expected_rewards_second_staking
+    cube_balance = cube_token.balanceOf(account)
+    # Assert
+    # Python computes the rewards with the same integer math as the contract
+    assert cube_balance_after_unstaking == expected_rewards_first_staking
+    assert cube_balance > 0
+    assert cube_balance == expected_rewards
+    assert len(claim_yield_rewards_tx.events["YieldRewarded"]) == 1
+
+
+def test_can_claim_yield_rewards_for_specific_tokens(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # A second CubeToken is used as another mintable token to stake
+    other_token = deploy_cube_token()
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    grant_role_tx = other_token.grantRole(
+        minter_role, account.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(account.address, amount_to_stake, {"from": cube_farm})
+    mint_tx.wait(1)
+    mint_tx = other_token.mint(account.address, amount_to_stake, {"from": account})
+    mint_tx.wait(1)
+    for token in [cube_token, other_token]:
+        set_price_feed_tx = cube_farm.setPriceFeedContract(
+            token.address,
+            get_contract("dai_usd_price_feed"),
+            {"from": account},
+        )
+        set_price_feed_tx.wait(1)
+        add_allowed_token_tx = cube_farm.addAllowedToken(
+            token.address, {"from": account}
+        )
+        add_allowed_token_tx.wait(1)
+        approve_tx = token.approve(
+            cube_farm.address, amount_to_stake, {"from": account}
+        )
+        approve_tx.wait(1)
+        stake_token_tx = cube_farm.stakeTokens(
+            amount_to_stake, token.address, {"from": account}
+        )
+        stake_token_tx.wait(1)
+    start_time_when_staked = cube_farm.getUserTokenStartTime(
+        account.address, cube_token.address
+    )
+    other_start_time_when_staked = cube_farm.getUserTokenStartTime(
+        account.address, other_token.address
+    )
+    # Add rate time (block is mined on the next transaction)
+    chain.sleep(RATE)
+    # Act
+    claim_yield_rewards_tx = cube_farm.claimYieldRewardsFor(
+        [cube_token.address], {"from": account}
+    )
+    claim_yield_rewards_tx.wait(1)
+    expected_rewards = calculate_rewards_based_on_time(
         amount_to_stake,
         INITIAL_PRICE_FEED_VALUE,
-        start_time_when_second_staking,
-        start_time_when_claimed,
-    ) / (10**DECIMALS)
-    expected_rewards = expected_rewards_first_staking + expected_rewards_second_staking
-    cube_balance = cube_token.balanceOf(account) / (10**DECIMALS)
+        start_time_when_staked,
+        claim_yield_rewards_tx.timestamp,
+    )
     # Assert
-    # Removing the decimals and asserting with isclose because python and solidity round and can be a bit different
-    assert math.isclose(
-        cube_balance_after_unstaking, expected_rewards_first_staking, rel_tol=REL_TOL
+    assert cube_farm.getNumberOfTokenStaked(account.address) == 2
+    assert cube_farm.getStakers() == [account.address]
+    assert cube_token.balanceOf(account) == expected_rewards
+    assert (
+        cube_farm.getUserTokenStartTime(account.address, cube_token.address)
+        == claim_yield_rewards_tx.timestamp
+    )
+    assert (
+        cube_farm.getUserTokenStartTime(account.address, other_token.address)
+        == other_start_time_when_staked
     )
-    assert cube_balance > 0
-    assert math.isclose(cube_balance, expected_rewards, rel_tol=REL_TOL)
     assert len(claim_yield_rewards_tx.events["YieldRewarded"]) == 1
+
+
+def test_can_get_total_rewards_accrued(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    other_account = get_account(index=1)
+    cube_token, cube_farm = cube_contracts
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    set_price_feed_tx = cube_farm.setPriceFeedContract(
+        cube_token.address,
+        get_contract("dai_usd_price_feed"),
+        {"from": account},
+    )
+    set_price_feed_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    for staker in [account, other_account]:
+        mint_tx = cube_token.mint(staker.address, amount_to_stake, {"from": cube_farm})
+        mint_tx.wait(1)
+        approve_tx = cube_token.approve(
+            cube_farm.address, amount_to_stake, {"from": staker}
+        )
+        approve_tx.wait(1)
+        stake_token_tx = cube_farm.stakeTokens(
+            amount_to_stake, cube_token.address, {"from": staker}
+        )
+        stake_token_tx.wait(1)
+    # Mine 1 block and add rate time
+    chain.mine(1, chain.sleep(RATE))
+    # Act
+    total_rewards_accrued = cube_farm.getTotalRewardsAccrued()
+    # Assert
+    assert cube_farm.getTotalStaked(cube_token.address) == amount_to_stake * 2
+    assert total_rewards_accrued > 0
+    # Pool and user rewards are rounded separately and can be a bit different
+    assert math.isclose(
+        total_rewards_accrued,
+        cube_farm.getTotalPendingRewards(account.address)
+        + cube_farm.getTotalPendingRewards(other_account.address),
+        rel_tol=REL_TOL,
+    )
+
+
+def test_removed_token_stops_accruing_rewards(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(account.address, amount_to_stake, {"from": cube_farm})
+    mint_tx.wait(1)
+    set_price_feed_tx = cube_farm.setPriceFeedContract(
+        cube_token.address,
+        get_contract("dai_usd_price_feed"),
+        {"from": account},
+    )
+    set_price_feed_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    approve_tx = cube_token.approve(
+        cube_farm.address, amount_to_stake, {"from": account}
+    )
+    approve_tx.wait(1)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, cube_token.address, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    # Add rate time (block is mined on the next transaction)
+    chain.sleep(RATE)
+    remove_allowed_token_tx = cube_farm.removeAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    remove_allowed_token_tx.wait(1)
+    pending_rewards_when_removed = cube_farm.getTotalPendingRewards(account.address)
+    # Mine 1 block and add rate time
+    chain.mine(1, chain.sleep(RATE))
+    # Act
+    unstake_token_tx = cube_farm.unstakeTokens(
+        amount_to_stake, cube_token.address, {"from": account}
+    )
+    unstake_token_tx.wait(1)
+    # Assert
+    assert pending_rewards_when_removed > 0
+    assert cube_farm.getUserCubeBalance(account.address) == pending_rewards_when_removed
+    assert cube_token.balanceOf(account) == amount_to_stake
+
+
+def test_can_stake_and_unstake_many_tokens(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # A second CubeToken is used as another mintable token to stake
+    other_token = deploy_cube_token()
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    grant_role_tx = other_token.grantRole(
+        minter_role, account.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(account.address, amount_to_stake, {"from": cube_farm})
+    mint_tx.wait(1)
+    mint_tx = other_token.mint(account.address, amount_to_stake, {"from": account})
+    mint_tx.wait(1)
+    for token in [cube_token, other_token]:
+        set_price_feed_tx = cube_farm.setPriceFeedContract(
+            token.address,
+            get_contract("dai_usd_price_feed"),
+            {"from": account},
+        )
+        set_price_feed_tx.wait(1)
+        add_allowed_token_tx = cube_farm.addAllowedToken(
+            token.address, {"from": account}
+        )
+        add_allowed_token_tx.wait(1)
+        approve_tx = token.approve(
+            cube_farm.address, amount_to_stake, {"from": account}
+        )
+        approve_tx.wait(1)
+    # Act
+    stake_many_tx = cube_farm.stakeMany(
+        [
+            (cube_token.address, amount_to_stake),
+            (other_token.address, amount_to_stake),
+        ],
+        {"from": account},
+    )
+    stake_many_tx.wait(1)
+    number_of_token_staked = cube_farm.getNumberOfTokenStaked(account.address)
+    stakers_after_staking = cube_farm.getStakers()
+    unstake_many_tx = cube_farm.unstakeMany(
+        [
+            (cube_token.address, amount_to_stake),
+            (other_token.address, amount_to_stake),
+        ],
+        {"from": account},
+    )
+    unstake_many_tx.wait(1)
+    # Assert
+    assert number_of_token_staked == 2
+    assert stakers_after_staking == [account.address]
+    assert len(stake_many_tx.events["TokenStaked"]) == 2
+    assert cube_farm.getNumberOfTokenStaked(account.address) == 0
+    assert account.address not in cube_farm.getStakers()
+    assert other_token.balanceOf(account) == amount_to_stake
+    assert len(unstake_many_tx.events["TokenUnstaked"]) == 2
+
+
+def test_cannot_exit_all_if_no_tokens_staked(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Act / Assert
+    with reverts("No tokens to unstake"):
+        cube_farm.exitAll({"from": account})
+
+
+def test_can_exit_all(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(account.address, amount_to_stake, {"from": cube_farm})
+    mint_tx.wait(1)
+    set_price_feed_tx = cube_farm.setPriceFeedContract(
+        cube_token.address,
+        get_contract("dai_usd_price_feed"),
+        {"from": account},
+    )
+    set_price_feed_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    approve_tx = cube_token.approve(
+        cube_farm.address, amount_to_stake, {"from": account}
+    )
+    approve_tx.wait(1)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, cube_token.address, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    start_time_when_staked = cube_farm.getUserTokenStartTime(
+        account.address, cube_token.address
+    )
+    # Add rate time (block is mined on the next transaction)
+    chain.sleep(RATE)
+    # Act
+    exit_all_tx = cube_farm.exitAll({"from": account})
+    exit_all_tx.wait(1)
+    expected_rewards = calculate_rewards_based_on_time(
+        amount_to_stake,
+        INITIAL_PRICE_FEED_VALUE,
+        start_time_when_staked,
+        exit_all_tx.timestamp,
+    )
+    # Assert
+    assert cube_farm.getUserTokenBalance(account.address, cube_token.address) == 0
+    assert cube_farm.getUserCubeBalance(account.address) == 0
+    assert account.address not in cube_farm.getStakers()
+    assert cube_token.balanceOf(account) == amount_to_stake + expected_rewards
+    assert len(exit_all_tx.events["TokenUnstaked"]) == 1
+    assert len(exit_all_tx.events["YieldRewarded"]) == 1
+
+
+def test_can_get_stakers_page_after_unstaking(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    stakers = [get_account(index=index) for index in range(1, 4)]
+    cube_token, cube_farm = cube_contracts
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    for staker in stakers:
+        mint_tx = cube_token.mint(staker.address, amount_to_stake, {"from": cube_farm})
+        mint_tx.wait(1)
+        approve_tx = cube_token.approve(
+            cube_farm.address, amount_to_stake, {"from": staker}
+        )
+        approve_tx.wait(1)
+        stake_token_tx = cube_farm.stakeTokens(
+            amount_to_stake, cube_token.address, {"from": staker}
+        )
+        stake_token_tx.wait(1)
+    # Act
+    # The last staker takes the place of the first one
+    unstake_token_tx = cube_farm.unstakeTokens(
+        amount_to_stake, cube_token.address, {"from": stakers[0]}
+    )
+    unstake_token_tx.wait(1)
+    # The moved staker can unstake too
+    unstake_token_tx = cube_farm.unstakeTokens(
+        amount_to_stake, cube_token.address, {"from": stakers[2]}
+    )
+    unstake_token_tx.wait(1)
+    # Assert
+    assert cube_farm.getStakerCount() == 1
+    assert cube_farm.getStakers() == [stakers[1].address]
+    assert cube_farm.getStakersPage(0, 10) == [stakers[1].address]
+    assert cube_farm.getStakersPage(1, 10) == []
+
+
+def test_can_get_user_portfolio(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(
+        account.address, amount_to_stake + amount_to_stake, {"from": cube_farm}
+    )
+    mint_tx.wait(1)
+    set_price_feed_tx = cube_farm.setPriceFeedContract(
+        cube_token.address,
+        get_contract("dai_usd_price_feed"),
+        {"from": account},
+    )
+    set_price_feed_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    approve_tx = cube_token.approve(
+        cube_farm.address, amount_to_stake + amount_to_stake, {"from": account}
+    )
+    approve_tx.wait(1)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, cube_token.address, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    # Add rate time (block is mined on the next transaction)
+    chain.sleep(RATE)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, cube_token.address, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    # Mine 1 block and add rate time
+    chain.mine(1, chain.sleep(RATE))
+    # Act
+    positions, cube_balance, total_pending_rewards = cube_farm.getUserPortfolio(
+        account.address
+    )
+    # Assert
+    assert len(positions) == 1
+    token, balance, start_time, pending_rewards = positions[0]
+    assert token == cube_token.address
+    assert balance == amount_to_stake + amount_to_stake
+    assert start_time == cube_farm.getUserTokenStartTime(
+        account.address, cube_token.address
+    )
+    assert pending_rewards == cube_farm.getUserPendingRewardsByToken(
+        account.address, cube_token.address
+    )
+    assert cube_balance == cube_farm.getUserCubeBalance(account.address)
+    assert cube_balance > 0
+    assert total_pending_rewards == cube_farm.getTotalPendingRewards(account.address)
+
+
+def test_can_get_pending_rewards_batch(configured_cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    other_account = get_account(index=1)
+    non_staker = get_account(index=2)
+    cube_token, cube_farm = configured_cube_contracts
+    weth_token = get_contract("weth_token")
+    link_token = get_contract("link_token")
+    for user, token in (
+        (account, weth_token),
+        (other_account, weth_token),
+        (other_account, link_token),
+    ):
+        mint_tx = token.mint(user, amount_to_stake, {"from": account})
+        mint_tx.wait(1)
+        approve_tx = token.approve(cube_farm, amount_to_stake, {"from": user})
+        approve_tx.wait(1)
+        stake_token_tx = cube_farm.stakeTokens(amount_to_stake, token, {"from": user})
+        stake_token_tx.wait(1)
+    # Mine 1 block and add rate time
+    chain.mine(1, chain.sleep(RATE))
+    users = [account, other_account, non_staker]
+    # Act
+    pending_rewards = cube_farm.getPendingRewardsBatch(users)
+    # Assert
+    assert pending_rewards == [cube_farm.getTotalPendingRewards(user) for user in users]
+    assert pending_rewards[0] > 0
+    assert pending_rewards[1] > pending_rewards[0]
+    assert pending_rewards[2] == 0
+
+
+def test_rewards_use_the_price_checkpoints(configured_cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    weth_token = get_contract("weth_token")
+    price_feed = get_contract("eth_usd_price_feed")
+    new_price = INITIAL_PRICE_FEED_VALUE * 2
+    mint_tx = weth_token.mint(account, amount_to_stake, {"from": account})
+    mint_tx.wait(1)
+    approve_tx = weth_token.approve(cube_farm, amount_to_stake, {"from": account})
+    approve_tx.wait(1)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, weth_token, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    start_time_when_staked = stake_token_tx.timestamp
+    update_price_tx = price_feed.updateRoundData(
+        1, new_price, chain.time(), chain.time(), {"from": account}
+    )
+    update_price_tx.wait(1)
+    # Act
+    chain.sleep(RATE)
+    # The new price is only read by this claim, the elapsed time accrues at the cached price
+    first_claim_tx = cube_farm.claimYieldRewards({"from": account})
+    first_claim_tx.wait(1)
+    chain.sleep(RATE)
+    poke_prices_tx = cube_farm.pokePrices({"from": get_account(index=1)})
+    poke_prices_tx.wait(1)
+    second_claim_tx = cube_farm.claimYieldRewards({"from": account})
+    second_claim_tx.wait(1)
+    # Assert
+    first_rewards, second_rewards = calculate_rewards_batch(
+        [amount_to_stake, amount_to_stake],
+        [INITIAL_PRICE_FEED_VALUE, new_price],
+        DECIMALS,
+        [start_time_when_staked, first_claim_tx.timestamp],
+        [first_claim_tx.timestamp, second_claim_tx.timestamp],
+    )
+    assert first_claim_tx.events["YieldRewarded"]["rewards"] == first_rewards
+    assert second_claim_tx.events["YieldRewarded"]["rewards"] == second_rewards
+
+
+def test_changing_price_feed_decimals_keeps_accrued_rewards(
+    configured_cube_contracts, amount_to_stake
+):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    weth_token = get_contract("weth_token")
+    # Same price as the current feed with 8 decimals instead of 18
+    price_feed = MockV3Aggregator.deploy(
+        8, INITIAL_PRICE_FEED_VALUE // 10 ** (DECIMALS - 8), {"from": account}
+    )
+    mint_tx = weth_token.mint(account, amount_to_stake, {"from": account})
+    mint_tx.wait(1)
+    approve_tx = weth_token.approve(cube_farm, amount_to_stake, {"from": account})
+    approve_tx.wait(1)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, weth_token, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    chain.sleep(RATE)
+    # Act
+    set_price_feed_tx = cube_farm.setPriceFeedContract(
+        weth_token, price_feed, {"from": account}
+    )
+    set_price_feed_tx.wait(1)
+    chain.sleep(RATE)
+    claim_tx = cube_farm.claimYieldRewards({"from": account})
+    claim_tx.wait(1)
+    # Assert
+    rewards = calculate_rewards_based_on_time(
+        amount_to_stake,
+        INITIAL_PRICE_FEED_VALUE,
+        stake_token_tx.timestamp,
+        claim_tx.timestamp,
+    )
+    assert claim_tx.events["YieldRewarded"]["rewards"] == rewards
+
+
+def stake_with_failing_price_feed(cube_farm, amount_to_stake):
+    # Stakes WETH priced by its own feed, which then reverts once a new price epoch started
+    account = get_account()
+    weth_token = get_contract("weth_token")
+    price_feed = MockV3Aggregator.deploy(
+        DECIMALS, INITIAL_PRICE_FEED_VALUE, {"from": account}
+    )
+    cube_farm.setPriceFeedContract(weth_token, price_feed, {"from": account}).wait(1)
+    weth_token.mint(account, amount_to_stake, {"from": account}).wait(1)
+    weth_token.approve(cube_farm, amount_to_stake, {"from": account}).wait(1)
+    cube_farm.stakeTokens(amount_to_stake, weth_token, {"from": account}).wait(1)
+    price_feed.setReverting(True, {"from": account}).wait(1)
+    chain.sleep(RATE)
+    return weth_token
+
+
+def test_can_unstake_after_removing_token_with_failing_price_feed(
+    configured_cube_contracts, amount_to_stake
+):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    _, cube_farm = configured_cube_contracts
+    weth_token = stake_with_failing_price_feed(cube_farm, amount_to_stake)
+    with reverts("Price feed reverting"):
+        cube_farm.unstakeTokens(amount_to_stake, weth_token, {"from": account})
+    # Act
+    remove_tx = cube_farm.removeAllowedToken(weth_token, {"from": account})
+    remove_tx.wait(1)
+    unstake_tx = cube_farm.unstakeTokens(amount_to_stake, weth_token, {"from": account})
+    unstake_tx.wait(1)
+    # Assert
+    assert cube_farm.getUserTokenBalance(account, weth_token) == 0
+    assert weth_token.balanceOf(account) == amount_to_stake
+
+
+def test_can_unstake_after_replacing_failing_price_feed(
+    configured_cube_contracts, amount_to_stake
+):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    _, cube_farm = configured_cube_contracts
+    weth_token = stake_with_failing_price_feed(cube_farm, amount_to_stake)
+    new_price_feed = MockV3Aggregator.deploy(
+        DECIMALS, INITIAL_PRICE_FEED_VALUE, {"from": account}
+    )
+    # Act
+    set_price_feed_tx = cube_farm.setPriceFeedContract(
+        weth_token, new_price_feed, {"from": account}
+    )
+    set_price_feed_tx.wait(1)
+    unstake_tx = cube_farm.unstakeTokens(amount_to_stake, weth_token, {"from": account})
+    unstake_tx.wait(1)
+    # Assert
+    assert cube_farm.getUserTokenBalance(account, weth_token) == 0
+    assert weth_token.balanceOf(account) == amount_to_stake
+
+
+def test_poke_prices_skips_failing_price_feed(
+    configured_cube_contracts, amount_to_stake
+):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    _, cube_farm = configured_cube_contracts
+    stake_with_failing_price_feed(cube_farm, amount_to_stake)
+    # Act
+    poke_prices_tx = cube_farm.pokePrices({"from": get_account(index=1)})
+    poke_prices_tx.wait(1)
+    # Assert
+    # The failing feed does not revert the refresh of the other tokens
+    assert poke_prices_tx.status == 1
+
+
+def test_cannot_schedule_rate_if_non_owner(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    non_owner = get_account(index=1)
+    cube_token, cube_farm = cube_contracts
+    # Act / Assert
+    with reverts("Only owner can schedule rate"):
+        cube_farm.scheduleRate(chain.time() + RATE, RATE, {"from": non_owner})
+
+
+def test_rewards_follow_the_rate_schedule(configured_cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    weth_token = get_contract("weth_token")
+    mint_tx = weth_token.mint(account, amount_to_stake, {"from": account})
+    mint_tx.wait(1)
+    approve_tx = weth_token.approve(cube_farm, amount_to_stake, {"from": account})
+    approve_tx.wait(1)
+    # Rewards are emitted twice as fast from the checkpoint
+    checkpoint_time = chain.time() + 100
+    schedule_rate_tx = cube_farm.scheduleRate(
+        checkpoint_time, RATE // 2, {"from": account}
+    )
+    schedule_rate_tx.wait(1)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, weth_token, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    start_time_when_staked = stake_token_tx.timestamp
+    # Act
+    chain.sleep(RATE)
+    claim_tx = cube_farm.claimYieldRewards({"from": account})
+    claim_tx.wait(1)
+    # Assert
+    equivalent_end_time = checkpoint_time + (claim_tx.timestamp - checkpoint_time) * 2
+    rewards = calculate_rewards_based_on_time(
+        amount_to_stake,
+        INITIAL_PRICE_FEED_VALUE,
+        start_time_when_staked,
+        equivalent_end_time,
+    )
+    assert claim_tx.events["YieldRewarded"]["rewards"] == rewards
+    assert cube_farm.getRate() == RATE // 2
+    assert cube_farm.getRateCheckpoint(0) == (checkpoint_time, RATE // 2)
+    with reverts("Cannot schedule rate in the past"):
+        cube_farm.scheduleRate(checkpoint_time, RATE, {"from": account})
+
+
+def test_rewards_follow_several_rate_checkpoints(
+    configured_cube_contracts, amount_to_stake
+):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    weth_token = get_contract("weth_token")
+    mint_tx = weth_token.mint(account, amount_to_stake, {"from": account})
+    mint_tx.wait(1)
+    approve_tx = weth_token.approve(cube_farm, amount_to_stake, {"from": account})
+    approve_tx.wait(1)
+    # The model only tracks the WETH stake, the other tokens have no stakers
+    model = CubeFarmModel("CUBE", RATE, now=chain.time())
+    model.set_feed("FEED", INITIAL_PRICE_FEED_VALUE, DECIMALS)
+    model.transact("add_allowed_token", "WETH")
+    model.transact("set_price_feed_contract", "WETH", "FEED")
+    first_checkpoint_time = chain.time() + 100
+    checkpoints = [
+        (first_checkpoint_time, RATE // 2),
+        (first_checkpoint_time + RATE, RATE * 3),
+        (first_checkpoint_time + RATE * 2, RATE // 4),
+    ]
+    for checkpoint_time, rate in checkpoints:
+        schedule_rate_tx = cube_farm.scheduleRate(
+            checkpoint_time, rate, {"from": account}
+        )
+        schedule_rate_tx.wait(1)
+        model.now = schedule_rate_tx.timestamp
+        model.transact("schedule_rate", checkpoint_time, rate)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, weth_token, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    model.now = stake_token_tx.timestamp
+    model.mint("WETH", "account", amount_to_stake)
+    model.transact("stake_tokens", "account", amount_to_stake, "WETH")
+    # Accrue between the checkpoints so the emission of the last update
+    # is found by the binary search
+    for checkpoint_time, rate in checkpoints[:-1]:
+        chain.sleep(checkpoint_time + RATE // 2 - chain.time())
+        poke_prices_tx = cube_farm.pokePrices({"from": account})
+        poke_prices_tx.wait(1)
+        model.now = poke_prices_tx.timestamp
+        model.transact("poke_prices")
+    # Act
+    chain.sleep(RATE)
+    claim_tx = cube_farm.claimYieldRewards({"from": account})
+    claim_tx.wait(1)
+    model.now = claim_tx.timestamp
+    model.transact("claim_yield_rewards", "account")
+    # Assert
+    rewards = model.token_balances[("CUBE", "account")]
+    assert claim_tx.events["YieldRewarded"]["rewards"] == rewards
+    assert rewards != calculate_rewards_based_on_time(
+        amount_to_stake,
+        INITIAL_PRICE_FEED_VALUE,
+        stake_token_tx.timestamp,
+        claim_tx.timestamp,
+    )
+    assert cube_farm.getRate() == RATE // 4
+    for index, checkpoint in enumerate(checkpoints):
+        assert cube_farm.getRateCheckpoint(index) == checkpoint
+
+
+def test_cannot_schedule_rate_with_too_high_timestamp(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Act / Assert
+    with reverts("Timestamp too high"):
+        cube_farm.scheduleRate(2**64, RATE, {"from": account})
+
+
+def test_cannot_compound_if_no_rewards(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    # Act / Assert
+    with reverts("No rewards to transfer"):
+        cube_farm.compound({"from": account})
+
+
+def test_can_compound_rewards(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(account.address, amount_to_stake, {"from": cube_farm})
+    mint_tx.wait(1)
+    set_price_feed_tx = cube_farm.setPriceFeedContract(
+        cube_token.address,
+        get_contract("dai_usd_price_feed"),
+        {"from": account},
+    )
+    set_price_feed_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    approve_tx = cube_token.approve(
+        cube_farm.address, amount_to_stake, {"from": account}
+    )
+    approve_tx.wait(1)
+    stake_token_tx = cube_farm.stakeTokens(
+        amount_to_stake, cube_token.address, {"from": account}
+    )
+    stake_token_tx.wait(1)
+    start_time_when_staked = cube_farm.getUserTokenStartTime(
+        account.address, cube_token.address
+    )
+    # Add rate time (block is mined on the next transaction)
+    chain.sleep(RATE)
+    # Act
+    compound_tx = cube_farm.compound({"from": account})
+    compound_tx.wait(1)
+    expected_rewards = calculate_rewards_based_on_time(
+        amount_to_stake,
+        INITIAL_PRICE_FEED_VALUE,
+        start_time_when_staked,
+        compound_tx.timestamp,
+    )
+    staking_balance = cube_farm.getUserTokenBalance(account.address, cube_token.address)
+    # Assert
+    assert cube_token.balanceOf(account) == 0
+    assert cube_farm.getUserCubeBalance(account.address) == 0
+    assert cube_token.balanceOf(cube_farm) == staking_balance
+    assert staking_balance == amount_to_stake + expected_rewards
+    assert (
+        cube_farm.getUserTokenStartTime(account.address, cube_token.address)
+        == compound_tx.timestamp
+    )
+    assert len(compound_tx.events["YieldRewarded"]) == 1
+    assert len(compound_tx.events["TokenStaked"]) == 1
+
+
+def test_can_stake_token_with_permit(cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    # The staker needs a private key to sign the permit
+    staker = accounts.add()
+    fund_tx = account.transfer(staker, Web3.toWei(1, "ether"))
+    fund_tx.wait(1)
+    cube_token, cube_farm = cube_contracts
+    # Transfer the role to CubeFarm
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, cube_farm.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(staker.address, amount_to_stake, {"from": cube_farm})
+    mint_tx.wait(1)
+    add_allowed_token_tx = cube_farm.addAllowedToken(
+        cube_token.address, {"from": account}
+    )
+    add_allowed_token_tx.wait(1)
+    deadline = chain.time() + 3600
+    v, r, s = get_permit_signature(
+        cube_token, staker, cube_farm.address, amount_to_stake, deadline
+    )
+    # Act
+    stake_token_tx = cube_farm.stakeWithPermit(
+        amount_to_stake, cube_token.address, deadline, v, r, s, {"from": staker}
+    )
+    stake_token_tx.wait(1)
+    # Assert
+    assert cube_token.balanceOf(staker) == 0
+    assert (
+        cube_farm.getUserTokenBalance(staker.address, cube_token.address)
+        == amount_to_stake
+    )
+    assert staker.address in cube_farm.getStakers()
+    assert len(stake_token_tx.events["TokenStaked"]) == 1
@@ -0,0 +1,123 @@
+from brownie import network, reverts, chain
+from scripts.helper import (
+    LOCAL_BLOCKCHAIN_ENV,
+    RATE,
+    INITIAL_PRICE_FEED_VALUE,
+    get_account,
+    get_contract,
+    calculate_rewards_based_on_time,
+)
+from scripts.deploy import deploy_cube_farm_factory, create_farm
+import pytest
+
+
+@pytest.fixture(scope="module")
+def cube_farm_factory(cube_contracts):
+    cube_token, cube_farm = cube_contracts
+    return deploy_cube_farm_factory(cube_token, cube_farm)
+
+
+def test_factory_constructor_set_up_correctly(cube_contracts, cube_farm_factory):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    cube_token, cube_farm = cube_contracts
+    # Act / Assert
+    assert cube_farm_factory.getImplementation() == cube_farm.address
+    assert cube_farm_factory.getCubeTokenAddress() == cube_token.address
+    assert cube_farm_factory.getFarmCount() == 0
+
+
+def test_can_create_farm_with_its_own_rate(cube_contracts, cube_farm_factory):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, _ = cube_contracts
+    # Act
+    farm = create_farm(cube_token, cube_farm_factory, RATE * 7)
+    # Assert
+    assert farm.getRate() == RATE * 7
+    assert farm.getCubeTokenAddress() == cube_token.address
+    assert cube_farm_factory.getFarms() == [farm.address]
+    add_tx = farm.addAllowedToken(cube_token, {"from": account})
+    add_tx.wait(1)
+    assert farm.getAllowedTokens() == [cube_token.address]
+
+
+def test_created_farms_are_independent(cube_contracts, cube_farm_factory):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    # Act
+    first_farm = create_farm(cube_token, cube_farm_factory, RATE)
+    second_farm = create_farm(cube_token, cube_farm_factory, RATE * 30)
+    add_tx = first_farm.addAllowedToken(cube_token, {"from": account})
+    add_tx.wait(1)
+    # Assert
+    assert cube_farm_factory.getFarms() == [first_farm.address, second_farm.address]
+    assert second_farm.getRate() == RATE * 30
+    assert second_farm.getAllowedTokens() == []
+    assert cube_farm.getAllowedTokens() == []
+
+
+def test_cannot_create_farm_if_non_owner(cube_farm_factory):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    non_owner = get_account(index=1)
+    # Act / Assert
+    with reverts("Only owner can create farm"):
+        cube_farm_factory.createFarm(RATE, {"from": non_owner})
+
+
+def test_cannot_initialize_twice(cube_contracts, cube_farm_factory):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    non_owner = get_account(index=1)
+    cube_token, cube_farm = cube_contracts
+    farm = create_farm(cube_token, cube_farm_factory)
+    # Act / Assert
+    with reverts("Already initialized"):
+        farm.initialize(cube_token, RATE, non_owner, {"from": non_owner})
+    with reverts("Already initialized"):
+        cube_farm.initialize(cube_token, RATE, non_owner, {"from": non_owner})
+
+
+def test_farm_created_by_factory_rewards_stakers(
+    cube_contracts, cube_farm_factory, amount_to_stake
+):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, _ = cube_contracts
+    farm = create_farm(cube_token, cube_farm_factory)
+    farm.setPriceFeedContract(
+        cube_token, get_contract("dai_usd_price_feed"), {"from": account}
+    ).wait(1)
+    farm.addAllowedToken(cube_token, {"from": account}).wait(1)
+    cube_token.grantRole(cube_token.MINTER_ROLE(), account, {"from": account}).wait(1)
+    cube_token.mint(account, amount_to_stake, {"from": account}).wait(1)
+    cube_token.approve(farm, amount_to_stake, {"from": account}).wait(1)
+    farm.stakeTokens(amount_to_stake, cube_token, {"from": account}).wait(1)
+    start_time_when_staked = farm.getUserTokenStartTime(account, cube_token)
+    # Add rate time (block is mined on the next transaction)
+    chain.sleep(RATE)
+    # Act
+    claim_tx = farm.claimYieldRewards({"from": account})
+    claim_tx.wait(1)
+    # Assert
+    expected_rewards = calculate_rewards_based_on_time(
+        amount_to_stake,
+        INITIAL_PRICE_FEED_VALUE,
+        start_time_when_staked,
+        farm.getUserTokenStartTime(account, cube_token),
+    )
+    assert expected_rewards > 0
+    assert cube_token.balanceOf(account) == expected_rewards
+    assert claim_tx.events["YieldRewarded"]["rewards"] == expected_rewards
+    assert farm.getUserTokenBalance(account, cube_token) == amount_to_stake
@@ -0,0 +1,72 @@
+from scripts.helper import (
+    RATE,
+    INITIAL_PRICE_FEED_VALUE,
+    DECIMALS,
+    calculate_rewards_based_on_time,
+)
+from scripts.cube_farm_model import CubeFarmModel, ModelRevert
+from web3 import Web3
+import pytest
+
+AMOUNT = Web3.toWei(1, "ether")
+
+
+def deploy_model():
+    model = CubeFarmModel("CUBE", RATE, now=1000)
+    model.set_feed("FEED", INITIAL_PRICE_FEED_VALUE, DECIMALS)
+    for token in ["CUBE", "WETH"]:
+        model.transact("add_allowed_token", token)
+        model.transact("set_price_feed_contract", token, "FEED")
+    model.mint("WETH", "alice", AMOUNT * 2)
+    return model
+
+
+def test_model_rewards_match_helper():
+    # Arrange
+    model = deploy_model()
+    model.transact("stake_tokens", "alice", AMOUNT, "WETH")
+    # Act
+    model.now += RATE + 123
+    model.transact("claim_yield_rewards", "alice")
+    # Assert
+    assert model.token_balances[("CUBE", "alice")] == calculate_rewards_based_on_time(
+        AMOUNT, INITIAL_PRICE_FEED_VALUE, 1000, 1000 + RATE + 123
+    )
+    assert model.get_user_token_start_time("alice", "WETH") == 1000 + RATE + 123
+    assert model.stakers == ["alice"]
+
+
+def test_model_state_is_unchanged_after_revert():
+    # Arrange
+    model = deploy_model()
+    model.transact("stake_tokens", "alice", AMOUNT, "WETH")
+    model.now += RATE
+    # Act
+    # The rewards are settled by the first unstake before the second one reverts
+    with pytest.raises(ModelRevert) as error:
+        model.transact("unstake_many", "alice", [("WETH", AMOUNT), ("WETH", AMOUNT)])
+    # Assert
+    assert error.value.revert_msg == "Cannot unstake 0 blance"
+    assert model.get_user_token_balance("alice", "WETH") == AMOUNT
+    assert model.get_user_cube_balance("alice") == 0
+    assert model.stakers == ["alice"]
+
+
+def test_model_rewards_follow_the_rate_schedule():
+    # Arrange
+    model = deploy_model()
+    model.transact("stake_tokens", "alice", AMOUNT, "WETH")
+    # Twice the emission during one rate period, then back to the initial rate
+    model.transact("schedule_rate", 1000 + RATE, RATE // 2)
+    model.transact("schedule_rate", 1000 + RATE * 2, RATE)
+    # Act
+    model.now += RATE * 3
+    model.transact("claim_yield_rewards", "alice")
+    # Assert
+    assert model.token_balances[("CUBE", "alice")] == calculate_rewards_based_on_time(
+        AMOUNT, INITIAL_PRICE_FEED_VALUE, 1000, 1000 + RATE * 4
+    )
+    assert model.get_rate() == RATE
+    with pytest.raises(ModelRevert) as error:
+        model.transact("schedule_rate", 1000 + RATE * 2, RATE)
+    assert error.value.revert_msg == "Cannot schedule rate in the past"
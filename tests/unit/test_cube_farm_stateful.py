@@ -0,0 +1,179 @@
+from brownie import network, exceptions, chain, history
+from brownie.test import strategy
+from scripts.helper import LOCAL_BLOCKCHAIN_ENV, RATE, get_account, get_contract
+from scripts.cube_farm_model import CubeFarmModel, ModelRevert
+from web3 import Web3
+import pytest
+
+USER_COUNT = 3
+INITIAL_BALANCE = Web3.toWei(100, "ether")
+MAX_UINT256 = 2**256 - 1
+
+
+class StateMachine:
+    # Replays random sequences against CubeFarm and the Python model and compares their state
+    user_index = strategy("uint256", max_value=USER_COUNT - 1)
+    token_index = strategy("uint256", max_value=3)
+    amount = strategy("uint256", min_value=1, max_value=Web3.toWei(20, "ether"))
+    seconds = strategy("uint256", max_value=RATE)
+    price = strategy("uint256", min_value=1, max_value=Web3.toWei(5000, "ether"))
+    rate = strategy("uint256", min_value=1, max_value=RATE * 7)
+
+    def __init__(cls, cube_token, cube_farm, tokens, users, price_feed):
+        cls.cube_token = cube_token
+        cls.cube_farm = cube_farm
+        cls.tokens = tokens
+        cls.users = users
+        cls.price_feed = price_feed
+
+    def setup(self):
+        # state_machine replaces the isolation snapshot with its own, taken before the first run and
+        # reverted to after each one, so the balances are set here to never outlive the test
+        account = get_account()
+        for user in self.users:
+            for token in self.tokens[:3]:
+                token.mint(user, INITIAL_BALANCE, {"from": account}).wait(1)
+            for token in self.tokens:
+                token.approve(self.cube_farm, MAX_UINT256, {"from": user}).wait(1)
+        # The contract cached the prices when it was configured, maybe in an earlier price epoch.
+        # Poking them first makes the contract and the model cache them in the same epoch
+        self.cube_farm.pokePrices({"from": account}).wait(1)
+        self.model = CubeFarmModel(
+            self.cube_token.address, self.cube_farm.getRate(), history[-1].timestamp
+        )
+        self.model.set_feed(
+            self.price_feed.address,
+            self.price_feed.latestRoundData()[1],
+            self.price_feed.decimals(),
+        )
+        for token in self.cube_farm.getAllowedTokens():
+            self.model.add_allowed_token(token)
+            self.model.set_price_feed_contract(
+                token, self.cube_farm.getPriceFeedContract(token)
+            )
+        for user in self.users:
+            for token in self.tokens:
+                self.model.mint(token.address, user.address, token.balanceOf(user))
+
+    def rule_stake(self, user_index, token_index, amount, seconds):
+        user, token = self.users[user_index], self.tokens[token_index].address
+        self.transact(
+            seconds, user, "stakeTokens", (amount, token), "stake_tokens", amount, token
+        )
+
+    def rule_unstake(self, user_index, token_index, amount, seconds):
+        user, token = self.users[user_index], self.tokens[token_index].address
+        # Unstake everything half of the time
+        if amount % 2 == 0:
+            amount = self.model.get_user_token_balance(user.address, token) or amount
+        self.transact(
+            seconds,
+            user,
+            "unstakeTokens",
+            (amount, token),
+            "unstake_tokens",
+            amount,
+            token,
+        )
+
+    def rule_claim(self, user_index, seconds):
+        user = self.users[user_index]
+        self.transact(seconds, user, "claimYieldRewards", (), "claim_yield_rewards")
+
+    def rule_compound(self, user_index, seconds):
+        user = self.users[user_index]
+        self.transact(seconds, user, "compound", (), "compound")
+
+    def rule_exit_all(self, user_index, seconds):
+        user = self.users[user_index]
+        self.transact(seconds, user, "exitAll", (), "exit_all")
+
+    def rule_update_price(self, price):
+        update_tx = self.price_feed.updateRoundData(
+            1, price, chain.time(), chain.time(), {"from": get_account()}
+        )
+        update_tx.wait(1)
+        self.model.set_feed(self.price_feed.address, price, self.price_feed.decimals())
+
+    def rule_schedule_rate(self, seconds, rate):
+        timestamp = chain.time() + seconds
+        revert_msg = None
+        try:
+            schedule_tx = self.cube_farm.scheduleRate(
+                timestamp, rate, {"from": get_account()}
+            )
+            schedule_tx.wait(1)
+        except exceptions.VirtualMachineError as error:
+            revert_msg = error.revert_msg or ""
+        self.model.now = history[-1].timestamp
+        try:
+            self.model.transact("schedule_rate", timestamp, rate)
+            assert revert_msg is None, f"scheduleRate reverted: {revert_msg}"
+        except ModelRevert as error:
+            assert revert_msg == error.revert_msg
+
+    def invariant_state_matches_model(self):
+        cube_farm, model = self.cube_farm, self.model
+        assert cube_farm.getStakers() == model.stakers
+        for user in self.users:
+            assert cube_farm.getUserStakedTokens(user) == model.get_user_tokens(
+                user.address
+            )
+            assert cube_farm.getUserCubeBalance(user) == model.get_user_cube_balance(
+                user.address
+            )
+            assert self.cube_token.balanceOf(user) == model.token_balances.get(
+                (self.cube_token.address, user.address), 0
+            )
+            for token in self.tokens:
+                assert cube_farm.getUserTokenBalance(
+                    user, token
+                ) == model.get_user_token_balance(user.address, token.address)
+                assert cube_farm.getUserTokenStartTime(
+                    user, token
+                ) == model.get_user_token_start_time(user.address, token.address)
+        for token in self.tokens:
+            assert cube_farm.getTotalStaked(token) == model.get_total_staked(
+                token.address
+            )
+
+    def transact(self, seconds, user, function_name, args, model_function, *model_args):
+        chain.sleep(seconds)
+        revert_msg = None
+        try:
+            getattr(self.cube_farm, function_name)(*args, {"from": user}).wait(1)
+        except exceptions.VirtualMachineError as error:
+            revert_msg = error.revert_msg or ""
+        # The model runs at the timestamp of the block the transaction was mined in
+        self.model.now = history[-1].timestamp
+        try:
+            self.model.transact(model_function, user.address, *model_args)
+            assert revert_msg is None, f"{function_name} reverted: {revert_msg}"
+        except ModelRevert as error:
+            assert revert_msg is not None, f"{function_name} should have reverted"
+            if error.revert_msg is not None:
+                assert revert_msg == error.revert_msg
+
+
+def test_cube_farm_matches_model(configured_cube_contracts, state_machine):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    cube_token, cube_farm = configured_cube_contracts
+    tokens = [
+        get_contract("weth_token"),
+        get_contract("fau_token"),
+        get_contract("link_token"),
+        cube_token,
+    ]
+    users = [get_account(index=index) for index in range(1, USER_COUNT + 1)]
+    # Act / Assert
+    state_machine(
+        StateMachine,
+        cube_token,
+        cube_farm,
+        tokens,
+        users,
+        get_contract("dai_usd_price_feed"),
+        settings={"max_examples": 20, "stateful_step_count": 25},
+    )
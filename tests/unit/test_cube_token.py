@@ -1,15 +1,19 @@
-from brownie import network, reverts
-from scripts.helper import LOCAL_BLOCKCHAIN_ENV, get_account
-from scripts.deploy import deploy_cube_token
+from brownie import network, reverts, accounts, chain
+from scripts.helper import (
+    LOCAL_BLOCKCHAIN_ENV,
+    get_account,
+    get_permit_signature,
+)
 import pytest
 
+SECP256K1N = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
 
-def test_constructor_set_up_correctly():
+
+def test_constructor_set_up_correctly(cube_token):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token = deploy_cube_token()
     admin_role = cube_token.DEFAULT_ADMIN_ROLE()
     # Act / Assert
     assert cube_token.name() == "Cube Token"
@@ -19,13 +23,12 @@ def test_constructor_set_up_correctly():
     assert cube_token.hasRole(admin_role, account.address)
 
 
-def test_approve(amount_to_stake):
+def test_approve(cube_token, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
     spender = get_account(index=1)
-    cube_token = deploy_cube_token()
     # Act
     approve_tx = cube_token.approve(spender.address, amount_to_stake, {"from": account})
     approve_tx.wait(1)
@@ -34,23 +37,21 @@ def test_approve(amount_to_stake):
     assert len(approve_tx.events["Approval"]) == 1
 
 
-def test_cannot_mint_if_non_minter():
+def test_cannot_mint_if_non_minter(cube_token):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     non_minter = get_account(index=1)
-    cube_token = deploy_cube_token()
     # Act / Assert
     with reverts("Sender is not the minter"):
         cube_token.mint(non_minter.address, 1, {"from": non_minter})
 
 
-def test_can_mint_if_minter(amount_to_stake):
+def test_can_mint_if_minter(cube_token, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token = deploy_cube_token()
     # Transfer the role to owner
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -66,24 +67,57 @@ def test_can_mint_if_minter(amount_to_stake):
     assert len(mint_tx.events["Transfer"]) == 1
 
 
-def test_cannot_grant_role_if_non_admin():
+def test_cannot_mint_batch_if_non_minter(cube_token):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    non_minter = get_account(index=1)
+    # Act / Assert
+    with reverts("Sender is not the minter"):
+        cube_token.mintBatch([non_minter.address], [1], {"from": non_minter})
+
+
+def test_can_mint_batch_if_minter(cube_token, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    receivers = [get_account(index=index) for index in range(1, 4)]
+    amounts = [amount_to_stake * index for index in range(1, 4)]
+    # Transfer the role to owner
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, account.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    # Act
+    mint_tx = cube_token.mintBatch(receivers, amounts, {"from": account})
+    mint_tx.wait(1)
+    # Assert
+    assert [cube_token.balanceOf(receiver) for receiver in receivers] == amounts
+    assert cube_token.totalSupply() == sum(amounts)
+    assert len(mint_tx.events["Transfer"]) == 3
+    assert mint_tx.events["Transfer"][2]["receiver"] == receivers[2]
+    with reverts("Length mismatch"):
+        cube_token.mintBatch(receivers, amounts[:2], {"from": account})
+
+
+def test_cannot_grant_role_if_non_admin(cube_token):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     non_admin = get_account(index=1)
-    cube_token = deploy_cube_token()
     minter_role = cube_token.MINTER_ROLE()
     # Act / Assert
     with reverts("Sender cannot grant role"):
         cube_token.grantRole(minter_role, non_admin.address, {"from": non_admin})
 
 
-def test_can_grant_role_if_admin():
+def test_can_grant_role_if_admin(cube_token):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token = deploy_cube_token()
     minter_role = cube_token.MINTER_ROLE()
     # Act
     grant_role_tx = cube_token.grantRole(
@@ -94,24 +128,22 @@ def test_can_grant_role_if_admin():
     assert cube_token.hasRole(minter_role, account.address)
 
 
-def test_cannot_revoke_role_if_non_admin():
+def test_cannot_revoke_role_if_non_admin(cube_token):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     non_admin = get_account(index=1)
-    cube_token = deploy_cube_token()
     minter_role = cube_token.MINTER_ROLE()
     # Act / Assert
     with reverts("Sender cannot revoke role"):
         cube_token.revokeRole(minter_role, non_admin.address, {"from": non_admin})
 
 
-def test_can_revoke_role_if_admin():
+def test_can_revoke_role_if_admin(cube_token):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
-    cube_token = deploy_cube_token()
     minter_role = cube_token.MINTER_ROLE()
     # Act
     revoke_role_tx = cube_token.revokeRole(
@@ -122,13 +154,12 @@ def test_can_revoke_role_if_admin():
     assert not cube_token.hasRole(minter_role, account.address)
 
 
-def test_can_transfer_token(amount_to_stake):
+def test_can_transfer_token(cube_token, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
     receiver = get_account(index=1)
-    cube_token = deploy_cube_token()
     # Transfer the role to owner
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -148,13 +179,45 @@ def test_can_transfer_token(amount_to_stake):
     assert len(transfer_tx.events["Transfer"]) == 1
 
 
-def test_can_transfer_from_token(amount_to_stake):
+def test_can_transfer_batch_token(cube_token, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    receivers = [get_account(index=index) for index in range(1, 3)]
+    # Transfer the role to owner
+    minter_role = cube_token.MINTER_ROLE()
+    grant_role_tx = cube_token.grantRole(
+        minter_role, account.address, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    mint_tx = cube_token.mint(account.address, amount_to_stake * 3, {"from": account})
+    mint_tx.wait(1)
+    # Act
+    transfer_tx = cube_token.transferBatch(
+        receivers + [account],
+        [amount_to_stake, amount_to_stake, amount_to_stake],
+        {"from": account},
+    )
+    transfer_tx.wait(1)
+    # Assert
+    assert cube_token.balanceOf(account.address) == amount_to_stake
+    assert cube_token.balanceOf(receivers[0].address) == amount_to_stake
+    assert cube_token.balanceOf(receivers[1].address) == amount_to_stake
+    assert cube_token.totalSupply() == amount_to_stake * 3
+    assert len(transfer_tx.events["Transfer"]) == 3
+    with reverts("Insufficient balance"):
+        cube_token.transferBatch(
+            receivers, [amount_to_stake, amount_to_stake], {"from": account}
+        )
+
+
+def test_can_transfer_from_token(cube_token, amount_to_stake):
     # Arrange
     if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
         pytest.skip("Only for local testing")
     account = get_account()
     receiver = get_account(index=1)
-    cube_token = deploy_cube_token()
     # Transfer the role to owner
     minter_role = cube_token.MINTER_ROLE()
     grant_role_tx = cube_token.grantRole(
@@ -176,3 +239,107 @@ def test_can_transfer_from_token(amount_to_stake):
     assert cube_token.balanceOf(account.address) == 0
     assert cube_token.balanceOf(receiver.address) == amount_to_stake
     assert len(transfer_from_tx.events["Transfer"]) == 1
+
+
+def test_can_permit(cube_token, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    # The owner needs a private key to sign the permit
+    owner = accounts.add()
+    spender = get_account(index=1)
+    deadline = chain.time() + 3600
+    v, r, s = get_permit_signature(
+        cube_token, owner, spender.address, amount_to_stake, deadline
+    )
+    # Act
+    permit_tx = cube_token.permit(
+        owner.address,
+        spender.address,
+        amount_to_stake,
+        deadline,
+        v,
+        r,
+        s,
+        {"from": spender},
+    )
+    permit_tx.wait(1)
+    # Assert
+    assert cube_token.allowance(owner.address, spender.address) == amount_to_stake
+    assert cube_token.nonces(owner.address) == 1
+    assert len(permit_tx.events["Approval"]) == 1
+
+
+def test_cannot_permit_with_invalid_signature(cube_token, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    owner = accounts.add()
+    spender = get_account(index=1)
+    deadline = chain.time() + 3600
+    v, r, s = get_permit_signature(
+        cube_token, owner, spender.address, amount_to_stake, deadline
+    )
+    # Act / Assert
+    # The signature is only valid for the signed amount
+    with reverts("Invalid signature"):
+        cube_token.permit(
+            owner.address,
+            spender.address,
+            amount_to_stake + 1,
+            deadline,
+            v,
+            r,
+            s,
+            {"from": spender},
+        )
+
+
+def test_cannot_permit_with_high_s_signature(cube_token, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    owner = accounts.add()
+    spender = get_account(index=1)
+    deadline = chain.time() + 3600
+    v, r, s = get_permit_signature(
+        cube_token, owner, spender.address, amount_to_stake, deadline
+    )
+    # The other signature of the same message, with s = n - s and the other v
+    high_s = (SECP256K1N - int.from_bytes(s, "big")).to_bytes(32, "big")
+    # Act / Assert
+    with reverts("Invalid signature s"):
+        cube_token.permit(
+            owner.address,
+            spender.address,
+            amount_to_stake,
+            deadline,
+            55 - v,
+            r,
+            high_s,
+            {"from": spender},
+        )
+
+
+def test_cannot_permit_if_expired(cube_token, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    owner = accounts.add()
+    spender = get_account(index=1)
+    deadline = chain.time() - 1
+    v, r, s = get_permit_signature(
+        cube_token, owner, spender.address, amount_to_stake, deadline
+    )
+    # Act / Assert
+    with reverts("Permit expired"):
+        cube_token.permit(
+            owner.address,
+            spender.address,
+            amount_to_stake,
+            deadline,
+            v,
+            r,
+            s,
+            {"from": spender},
+        )
@@ -0,0 +1,25 @@
+from brownie import network
+from scripts.helper import LOCAL_BLOCKCHAIN_ENV, get_account, get_contract
+from scripts.deploy import setup_cube_farm
+import pytest
+
+
+def test_setup_cube_farm_only_sends_missing_transactions(cube_contracts):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = cube_contracts
+    first_setup_transactions = setup_cube_farm(cube_token, cube_farm)
+    weth_token = get_contract("weth_token")
+    remove_tx = cube_farm.removeAllowedToken(weth_token, {"from": account})
+    remove_tx.wait(1)
+    # Act
+    second_setup_transactions = setup_cube_farm(cube_token, cube_farm)
+    third_setup_transactions = setup_cube_farm(cube_token, cube_farm)
+    # Assert
+    assert len(first_setup_transactions) == 9
+    assert [tx.fn_name for tx in second_setup_transactions] == ["addAllowedToken"]
+    assert third_setup_transactions == []
+    assert len(cube_farm.getAllowedTokens()) == 4
+    assert cube_token.hasRole(cube_token.MINTER_ROLE(), cube_farm)
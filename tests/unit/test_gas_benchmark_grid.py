@@ -0,0 +1,59 @@
+from scripts.gas_benchmark_grid import (
+    check_regressions,
+    load_baseline,
+    write_baseline,
+    GasRegressionError,
+)
+import pytest
+
+
+def test_check_regressions_only_reports_operations_over_the_threshold():
+    # Arrange
+    baseline = [
+        {"tokens": 1, "stakers": 1, "operation": "stakeTokens", "gas_used": 100000},
+        {"tokens": 1, "stakers": 1, "operation": "unstakeTokens", "gas_used": 100000},
+    ]
+    rows = [
+        {"tokens": 1, "stakers": 1, "operation": "stakeTokens", "gas_used": 104000},
+        {"tokens": 1, "stakers": 1, "operation": "unstakeTokens", "gas_used": 106000},
+        # Not in the baseline yet
+        {"tokens": 8, "stakers": 1, "operation": "stakeTokens", "gas_used": 200000},
+    ]
+    # Act
+    regressions = check_regressions(rows, baseline, max_regression=5)
+    # Assert
+    assert regressions == [(rows[1], 100000)]
+
+
+def test_load_baseline_fails_without_baseline(tmp_path):
+    # Act / Assert
+    with pytest.raises(FileNotFoundError):
+        load_baseline(str(tmp_path / "gas_baseline.json"))
+
+
+def test_saved_baseline_is_loaded_back(tmp_path):
+    # Arrange
+    baseline_path = str(tmp_path / "benchmarks" / "gas_baseline.json")
+    rows = [
+        {"tokens": 1, "stakers": 1, "operation": "stakeTokens", "gas_used": 100000},
+    ]
+    # Act
+    write_baseline(rows, baseline_path)
+    # Assert
+    assert load_baseline(baseline_path) == rows
+    assert check_regressions(rows, load_baseline(baseline_path)) == []
+
+
+def test_gas_regression_error_reports_the_regressed_operations():
+    # Arrange
+    row = {
+        "tokens": 8,
+        "stakers": 32,
+        "operation": "claimYieldRewards",
+        "gas_used": 1100,
+    }
+    # Act
+    error = GasRegressionError([(row, 1000)], 5)
+    # Assert
+    assert error.regressions == [(row, 1000)]
+    assert "claimYieldRewards with 8 tokens and 32 stakers: 1000 -> 1100" in str(error)
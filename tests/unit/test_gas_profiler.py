@@ -0,0 +1,61 @@
+from scripts.gas_profiler import (
+    profile_trace,
+    get_step_costs,
+    get_function_totals,
+    format_folded_stacks,
+)
+
+
+def get_trace():
+    # CubeFarm.stakeTokens reads a price from a feed in an internal function and writes a position
+    steps = [
+        (1, "CubeFarm.stakeTokens", 0, "PUSH1", 10000, 3),
+        (1, "CubeFarm.getTokenValue", 1, "SLOAD", 9997, 2100),
+        (1, "CubeFarm.getTokenValue", 1, "STATICCALL", 7897, 7897),
+        (2, "MockV3Aggregator.latestRoundData", 0, "SLOAD", 5000, 2100),
+        (2, "MockV3Aggregator.latestRoundData", 0, "RETURN", 2900, 0),
+        (1, "CubeFarm.stakeTokens", 0, "SSTORE", 5697, 5000),
+        (1, "CubeFarm.stakeTokens", 0, "STOP", 697, 0),
+    ]
+    return [
+        {
+            "depth": depth,
+            "fn": fn,
+            "jumpDepth": jump_depth,
+            "op": op,
+            "gas": gas,
+            "gasCost": gas_cost,
+        }
+        for depth, fn, jump_depth, op, gas, gas_cost in steps
+    ]
+
+
+def test_step_costs_exclude_the_gas_used_by_the_called_contract():
+    # Act
+    costs = get_step_costs(get_trace())
+    # Assert
+    assert costs == [3, 2100, 100, 2100, 0, 5000, 0]
+
+
+def test_profile_trace_by_call_stack_and_function():
+    # Act
+    profile = profile_trace(get_trace())
+    totals = get_function_totals(profile)
+    # Assert
+    assert profile[("CubeFarm.stakeTokens", "CubeFarm.getTokenValue")] == {
+        "gas": 2200,
+        "sload": 1,
+        "sstore": 0,
+        "calls": 1,
+        "call_targets": {"MockV3Aggregator.latestRoundData"},
+    }
+    assert totals["CubeFarm.stakeTokens"]["gas"] == 9303
+    assert totals["CubeFarm.stakeTokens"]["self_gas"] == 5003
+    assert totals["CubeFarm.stakeTokens"]["sstore"] == 1
+    assert totals["CubeFarm.getTokenValue"]["gas"] == 4300
+    assert format_folded_stacks([("stake", 30303, profile)]).splitlines() == [
+        "stake;CubeFarm.stakeTokens 5003",
+        "stake;CubeFarm.stakeTokens;CubeFarm.getTokenValue 2200",
+        "stake;CubeFarm.stakeTokens;CubeFarm.getTokenValue;"
+        "MockV3Aggregator.latestRoundData 2100",
+    ]
@@ -0,0 +1,124 @@
+from brownie import network, chain
+from scripts.helper import LOCAL_BLOCKCHAIN_ENV, get_account
+from scripts.indexer import (
+    open_index,
+    sync_events,
+    get_checkpoint,
+    find_common_block,
+    get_position,
+    get_positions,
+    get_stakers,
+    get_total_rewarded,
+)
+import pytest
+
+
+def stake_cube_token(cube_token, cube_farm, account, amount):
+    minter_role = cube_token.MINTER_ROLE()
+    cube_token.grantRole(minter_role, account, {"from": account}).wait(1)
+    cube_token.mint(account, amount, {"from": account}).wait(1)
+    cube_token.approve(cube_farm, amount, {"from": account}).wait(1)
+    cube_farm.stakeTokens(amount, cube_token, {"from": account}).wait(1)
+
+
+def test_can_index_farm_events(configured_cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    stake_cube_token(cube_token, cube_farm, account, amount_to_stake * 2)
+    chain.sleep(1000)
+    cube_farm.unstakeTokens(amount_to_stake, cube_token, {"from": account}).wait(1)
+    claim_tx = cube_farm.claimYieldRewards({"from": account})
+    claim_tx.wait(1)
+    connection = open_index(":memory:")
+    # Act
+    # A small page size makes the indexer go through several eth_getLogs pages
+    new_events = sync_events(connection, cube_farm, page_size=2)
+    # Assert
+    assert new_events == 3
+    assert get_checkpoint(connection, cube_farm)[0] == chain.height
+    assert get_positions(connection, cube_farm, account.address) == {
+        cube_token.address: amount_to_stake
+    }
+    assert get_position(
+        connection, cube_farm, account.address, cube_token.address
+    ) == cube_farm.getUserTokenBalance(account, cube_token)
+    assert get_stakers(connection, cube_farm) == [account.address]
+    assert (
+        get_total_rewarded(connection, cube_farm, account.address)
+        == claim_tx.events["YieldRewarded"]["rewards"]
+    )
+
+
+def test_can_index_incrementally(configured_cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    stake_cube_token(cube_token, cube_farm, account, amount_to_stake)
+    connection = open_index(":memory:")
+    sync_events(connection, cube_farm)
+    # Act
+    cube_farm.unstakeTokens(amount_to_stake, cube_token, {"from": account}).wait(1)
+    new_events = sync_events(connection, cube_farm)
+    # Assert
+    assert new_events == 1
+    assert get_positions(connection, cube_farm, account.address) == {}
+    assert get_stakers(connection, cube_farm) == []
+
+
+def test_can_roll_back_reorged_blocks(configured_cube_contracts, amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    stake_cube_token(cube_token, cube_farm, account, amount_to_stake)
+    connection = open_index(":memory:")
+    sync_events(connection, cube_farm)
+    cube_farm.unstakeTokens(amount_to_stake, cube_token, {"from": account}).wait(1)
+    sync_events(connection, cube_farm)
+    # Act
+    # Undoing the unstake and mining other blocks replaces it like a reorg would
+    chain.undo()
+    chain.mine(2)
+    sync_events(connection, cube_farm)
+    # Assert
+    assert get_checkpoint(connection, cube_farm)[0] == chain.height
+    assert get_positions(connection, cube_farm, account.address) == {
+        cube_token.address: amount_to_stake
+    }
+
+
+def test_can_roll_back_reorgs_deeper_than_the_last_checkpoint(
+    configured_cube_contracts, amount_to_stake
+):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token, cube_farm = configured_cube_contracts
+    stake_cube_token(cube_token, cube_farm, account, amount_to_stake)
+    fork_block = chain.height
+    cube_farm.unstakeTokens(amount_to_stake, cube_token, {"from": account}).wait(1)
+    chain.mine(20)
+    connection = open_index(":memory:")
+    # A page size of one block keeps a checkpoint for every block
+    sync_events(connection, cube_farm, page_size=1)
+    # Act
+    # Checkpoints with hashes no longer on the chain look like a reorg after fork_block
+    connection.execute(
+        "UPDATE checkpoints SET block_hash = '0x00' WHERE block_number > ?",
+        (fork_block,),
+    )
+    common_block = find_common_block(connection, cube_farm)
+    new_events = sync_events(connection, cube_farm)
+    # Assert
+    assert common_block == fork_block
+    assert new_events == 1
+    assert get_checkpoint(connection, cube_farm)[0] == chain.height
+    assert get_positions(connection, cube_farm, account.address) == {}
+    assert connection.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2
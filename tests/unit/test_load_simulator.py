@@ -0,0 +1,28 @@
+from brownie import network
+from scripts.helper import LOCAL_BLOCKCHAIN_ENV
+from scripts.load_simulator import simulate, get_percentile
+import pytest
+
+
+def test_get_percentile():
+    # Arrange
+    values = list(range(100, 0, -1))
+    # Act / Assert
+    assert get_percentile(values, 50) == 50
+    assert get_percentile(values, 99) == 99
+    assert get_percentile([7], 90) == 7
+
+
+def test_can_simulate_load():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    steps = 30
+    # Act
+    results = simulate(account_count=3, steps=steps, seed=1)
+    # Assert
+    # Every step is either a successful or a failed transaction
+    successful = sum(len(gas_used) for gas_used in results["gas_used"].values())
+    assert successful + sum(results["failures"].values()) == steps
+    assert len(results["gas_used"]["stake"]) > 0
+    assert results["transactions_per_second"] > 0
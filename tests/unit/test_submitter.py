@@ -0,0 +1,91 @@
+from brownie import network, CubeToken
+from scripts.helper import LOCAL_BLOCKCHAIN_ENV, get_account
+from scripts.deploy import deploy_cube_token
+from scripts.submitter import Submitter, is_already_sent
+import pytest
+
+
+def test_can_deploy_at_predicted_address():
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    submitter = Submitter(account)
+    # Act
+    cube_token_address = submitter.deploy(CubeToken)
+    submitter.wait_all()
+    # Assert
+    assert CubeToken.at(cube_token_address).name() == "Cube Token"
+
+
+def test_can_send_independent_transactions_without_waiting(amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    receivers = [get_account(index=1), get_account(index=2)]
+    cube_token = deploy_cube_token()
+    grant_role_tx = cube_token.grantRole(
+        cube_token.MINTER_ROLE(), account, {"from": account}
+    )
+    grant_role_tx.wait(1)
+    submitter = Submitter(account)
+    first_nonce = submitter.nonce
+    # Act
+    for receiver in receivers:
+        submitter.send(cube_token.mint, receiver, amount_to_stake)
+    transactions = submitter.wait_all()
+    # Assert
+    # Executed in the order they were sent
+    assert [tx.nonce for tx in transactions] == [first_nonce, first_nonce + 1]
+    assert all(tx.status == 1 for tx in transactions)
+    assert [cube_token.balanceOf(receiver) for receiver in receivers] == [
+        amount_to_stake,
+        amount_to_stake,
+    ]
+    assert submitter.nonce == first_nonce + 2
+
+
+def test_dependent_transactions_are_sent_with_a_gas_limit(amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token = deploy_cube_token()
+    submitter = Submitter(account)
+    # Act
+    submitter.send(cube_token.grantRole, cube_token.MINTER_ROLE(), account)
+    # The mint would revert in the gas estimation until the role is granted
+    submitter.send(cube_token.mint, account, amount_to_stake, gas_limit=100000)
+    transactions = submitter.wait_all()
+    # Assert
+    assert transactions[1].gas_limit == 100000
+    assert all(tx.status == 1 for tx in transactions)
+    assert cube_token.balanceOf(account) == amount_to_stake
+
+
+def test_finds_the_mined_transaction_of_a_nonce(amount_to_stake):
+    # Arrange
+    if network.show_active() not in LOCAL_BLOCKCHAIN_ENV:
+        pytest.skip("Only for local testing")
+    account = get_account()
+    cube_token = deploy_cube_token()
+    submitter = Submitter(account)
+    tx = submitter.send(cube_token.approve, get_account(index=1), amount_to_stake)
+    tx.wait(1)
+    # Act
+    # Like a replaced transaction mined before its replacement, which brownie reports as dropped
+    mined = submitter.find_mined(0)
+    # Assert
+    assert mined.txid == tx.txid
+    assert mined.status == 1
+
+
+def test_already_known_transactions_are_not_sent_again():
+    # Act / Assert
+    assert is_already_sent(ValueError("already known"), 0)
+    assert is_already_sent(ValueError("Known transaction: 0x12"), 1)
+    # A nonce too low is only caused by an earlier attempt of the same transaction on a retry
+    assert not is_already_sent(ValueError("nonce too low"), 0)
+    assert is_already_sent(ValueError("nonce too low"), 1)
+    assert not is_already_sent(ValueError("replacement transaction underpriced"), 1)
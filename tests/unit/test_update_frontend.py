@@ -0,0 +1,29 @@
+from scripts.update_frontend import sync_folder
+import os
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(content)
+
+
+def test_sync_folder_only_copies_changed_files(tmp_path):
+    # Arrange
+    src, dest = str(tmp_path / "build"), str(tmp_path / "chain-info")
+    write(os.path.join(src, "contracts", "CubeFarm.json"), "farm")
+    write(os.path.join(src, "contracts", "CubeToken.json"), "token")
+    write(os.path.join(src, "contracts", "MockDAI.json"), "dai")
+    sync_folder(src, dest)
+    # Marks the copy of an unchanged file to check it is not copied again
+    write(os.path.join(dest, "contracts", "CubeToken.json"), "not copied again")
+    # Act
+    write(os.path.join(src, "contracts", "CubeFarm.json"), "new farm")
+    os.remove(os.path.join(src, "contracts", "MockDAI.json"))
+    sync_folder(src, dest)
+    # Assert
+    with open(os.path.join(dest, "contracts", "CubeFarm.json")) as file:
+        assert file.read() == "new farm"
+    with open(os.path.join(dest, "contracts", "CubeToken.json")) as file:
+        assert file.read() == "not copied again"
+    assert not os.path.exists(os.path.join(dest, "contracts", "MockDAI.json"))